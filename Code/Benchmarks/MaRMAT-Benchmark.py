@@ -0,0 +1,541 @@
+"""Benchmark suite for the MaRMAT matching engine.
+
+Synthetic metadata shaped like example-input-metadata.csv and lexicons of any size are generated
+from the sample files in the Code folder, each (rows, terms) case is matched in a fresh process,
+and throughput, peak memory and agreement with the original per-term regex loop are written to
+a JSON file. Two result files (e.g. from two commits) can then be compared.
+
+Usage:
+    python3 MaRMAT-Benchmark.py run --rows 10000,100000 --terms 100,1000 --output results.json
+    python3 MaRMAT-Benchmark.py compare before.json after.json
+    python3 MaRMAT-Benchmark.py check
+    python3 MaRMAT-Benchmark.py generate --rows 10000 --output metadata.csv
+    python3 MaRMAT-Benchmark.py lexicon --terms 1000 --output lexicon.csv
+"""
+
+import argparse
+import contextlib
+import csv
+import importlib.util
+import inspect
+import io
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARMAT_PATH = os.path.join(CODE_DIR, "MarMAT-CommandLine-2.6.py")
+EXAMPLE_METADATA = os.path.join(CODE_DIR, "example-input-metadata.csv")
+LEXICONS = [os.path.join(CODE_DIR, "lexicon-reparative-metadata.csv"), os.path.join(CODE_DIR, "lexicon-LCSH.csv")]
+METADATA_COLUMNS = ['id', 'title', 'description', 'creator', 'date', 'collection name', 'subjects',
+                    'spatial coverage']
+MATCHED_COLUMNS = ['title', 'description', 'subjects']
+
+
+sys.path.insert(0, CODE_DIR)  # So that `import marmat` works here and in spawned worker processes
+
+
+def load_marmat():
+    """Import the command-line tool as a module, through marmat.py where the checkout has it."""
+    try:
+        import marmat
+        return marmat
+    except ModuleNotFoundError as e:
+        if e.name != 'marmat':
+            raise
+    # Older checkouts: load the file directly (process-pool matching then works with "fork" only)
+    spec = importlib.util.spec_from_file_location("marmat", MARMAT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["marmat"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_csv_rows(file_path):
+    """Read a CSV file shipped with MaRMAT into a list of dictionaries."""
+    with open(file_path, newline='', encoding='latin1') as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+def read_lexicon_terms():
+    """Return the (term, category) pairs of the sample lexicons, without repeated terms."""
+    seen = set()
+    terms = []
+    for lexicon_path in LEXICONS:
+        for row in read_csv_rows(lexicon_path):
+            if row['term'].lower() not in seen:
+                seen.add(row['term'].lower())
+                terms.append((row['term'], row['category']))
+    return terms
+
+
+def build_lexicon(size, seed=0):
+    """Build a lexicon of `size` terms from the sample lexicons padded with made-up terms.
+
+    Parameters:
+    size (int): Number of terms.
+    seed (int): Seed for the random generator, so runs are reproducible.
+
+    Returns:
+    list of tuple: (term, category) pairs.
+
+    """
+    rng = random.Random(seed)
+    real_terms = read_lexicon_terms()
+    if size <= len(real_terms):
+        return rng.sample(real_terms, size)
+
+    syllables = ['ka', 'lo', 'mi', 'ren', 'tu', 'sha', 'vor', 'ex', 'qui', 'dal', 'ne', 'ob', 'zan', 'pir']
+    terms = list(real_terms)
+    seen = {term.lower() for term, category in terms}
+    while len(terms) < size:
+        words = [''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+                 for _ in range(rng.randint(1, 3))]
+        term = ' '.join(words)
+        if term not in seen:
+            seen.add(term)
+            terms.append((term, f"Synthetic{len(terms) % 8}"))
+    return terms
+
+
+def generate_metadata(rows, title_words=8, description_words=35, match_density=0.1, seed=0):
+    """Yield synthetic metadata rows shaped like example-input-metadata.csv.
+
+    Parameters:
+    rows (int): Number of rows to generate.
+    title_words (int): Average number of words in a title.
+    description_words (int): Average number of words in a description.
+    match_density (float): Probability that a title, description or subjects cell contains a
+        term from the reparative metadata lexicon.
+    seed (int): Seed for the random generator, so runs are reproducible.
+
+    Yields:
+    list: One row of values, in the order of METADATA_COLUMNS.
+
+    """
+    rng = random.Random(seed)
+    example = read_csv_rows(EXAMPLE_METADATA)
+    lexicon_words = {term.lower() for term, category in read_lexicon_terms()}
+    vocabulary = sorted({word for row in example for col in ('title', 'description')
+                         for word in re.findall(r"[A-Za-z][A-Za-z'-]+", row[col] or '')
+                         if word.lower() not in lexicon_words})
+    headings = sorted({heading.strip() for row in example for heading in (row['subjects'] or '').split(';')
+                       if heading.strip()})
+    creators = sorted({row['creator'] for row in example if row['creator']})
+    collections = sorted({row['collection name'] for row in example if row['collection name']})
+    places = sorted({row['spatial coverage'] for row in example if row['spatial coverage']})
+    match_terms = [row['term'] for row in read_csv_rows(LEXICONS[0])]
+
+    def text(average_words):
+        words = rng.choices(vocabulary, k=max(1, int(rng.gauss(average_words, average_words / 3))))
+        if rng.random() < match_density:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(match_terms))
+        return ' '.join(words)
+
+    for row_number in range(rows):
+        subjects = rng.sample(headings, rng.randint(2, 6))
+        if rng.random() < match_density:
+            subjects.insert(rng.randrange(len(subjects) + 1), rng.choice(match_terms))
+        yield [
+            100000 + row_number,
+            text(title_words),
+            text(description_words),
+            rng.choice(creators),
+            '; '.join(str(year) for year in range(rng.randint(1890, 2000), rng.randint(2001, 2004))[:rng.randint(1, 3)]),
+            rng.choice(collections),
+            '; '.join(subjects),
+            rng.choice(places),
+        ]
+
+
+def write_metadata(file_path, rows, **options):
+    """Write synthetic metadata to a CSV file."""
+    with open(file_path, 'w', newline='', encoding='latin1', errors='replace') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(METADATA_COLUMNS)
+        writer.writerows(generate_metadata(rows, **options))
+
+
+def write_lexicon(file_path, size, seed=0):
+    """Write a synthetic lexicon to a CSV file."""
+    with open(file_path, 'w', newline='', encoding='latin1', errors='replace') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['term', 'category'])
+        writer.writerows(build_lexicon(size, seed))
+
+
+def reference_matches(lexicon_df, metadata_df, selected_columns, identifier_column):
+    """The original MaRMAT matching loop, one regex search per term per cell."""
+    matches = []
+    for index, row in metadata_df.iterrows():
+        for col in selected_columns:
+            if isinstance(row[col], str):
+                for term, category in zip(lexicon_df['term'], lexicon_df['category']):
+                    if re.search(r'\b' + re.escape(term.lower()) + r'\b', row[col].lower()):
+                        matches.append((row[identifier_column], term, category, col))
+    return matches
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in megabytes, or None if unavailable."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_case(metadata_path, lexicon_path, workers=1, reference_budget=100000):
+    """Match one metadata file against one lexicon and measure it.
+
+    Parameters:
+    metadata_path (str): Path to the metadata CSV file.
+    lexicon_path (str): Path to the lexicon CSV file.
+    workers (int): Number of processes to match in.
+    reference_budget (int): Maximum number of (cell, term) regex searches spent re-checking the
+        leading rows with the reference implementation.
+
+    Returns:
+    dict: Measurements for the case.
+
+    """
+    marmat = load_marmat()
+    tool = marmat.MaRMAT()
+    with contextlib.redirect_stdout(io.StringIO()):
+        tool.load_lexicon(lexicon_path)
+        start = time.perf_counter()
+        tool.load_metadata(metadata_path)
+        load_seconds = time.perf_counter() - start
+    tool.select_identifier_column('id')
+    categories = tool.lexicon_df['category'].unique().tolist()
+
+    # Older commits of the tool, which this harness is meant to compare against, match in one process only
+    options = {'workers': workers} if 'workers' in inspect.signature(tool.find_matches).parameters else {}
+    start = time.perf_counter()
+    matches = tool.find_matches(MATCHED_COLUMNS, categories, **options)
+    match_seconds = time.perf_counter() - start
+    rows = len(tool.metadata_df)
+
+    # The reference loop is far too slow for whole files, so compare on the leading rows only
+    reference_rows = max(1, reference_budget // (len(tool.lexicon_df) * len(MATCHED_COLUMNS)))
+    head = tool.metadata_df.head(reference_rows)
+    expected = reference_matches(tool.lexicon_df, head, MATCHED_COLUMNS, 'id')
+    tool.metadata_df = head
+    actual = tool.find_matches(MATCHED_COLUMNS, categories)
+
+    return {
+        'rows': rows,
+        'terms': len(tool.lexicon_df),
+        'workers': options.get('workers', 1),
+        'load_seconds': round(load_seconds, 4),
+        'match_seconds': round(match_seconds, 4),
+        'rows_per_second': round(rows / match_seconds, 1) if match_seconds else None,
+        'matches': len(matches),
+        'peak_rss_mb': peak_rss_mb(),
+        'reference_rows': len(head),
+        'reference_matches': len(expected),
+        'reference_equal': list(actual) == expected,  # find_matches may return a MatchTable
+    }
+
+
+def read_match_file(marmat, file_path):
+    """Read a match file written by any MaRMAT sink back into a DataFrame of strings."""
+    import pandas as pd
+    if file_path.endswith('.parquet'):
+        matches_df = marmat.pyarrow.parquet.read_table(file_path).to_pandas()
+    elif file_path.endswith('.arrow'):
+        with marmat.pyarrow.ipc.open_stream(file_path) as reader:
+            matches_df = reader.read_all().to_pandas()
+    else:
+        with marmat.open_decompressed(file_path) as csv_file:
+            matches_df = pd.read_csv(csv_file, dtype=str, keep_default_na=False)
+    return matches_df.astype(str)
+
+
+def match_to_file(marmat, metadata_path, lexicon_path, output_file, chunk_size=None):
+    """Match every lexicon category in the benchmark columns of a file and save the results, quietly."""
+    tool = marmat.MaRMAT()
+    with contextlib.redirect_stdout(io.StringIO()):
+        tool.load_lexicon(lexicon_path)
+        tool.load_metadata(metadata_path, chunk_size=chunk_size)
+        tool.select_columns(MATCHED_COLUMNS)
+        tool.select_identifier_column('id')
+        tool.select_categories(tool.lexicon_df['category'].unique().tolist())
+        tool.perform_matching(output_file, show=False)
+
+
+def check_sinks(marmat, metadata_path, lexicon_path, work_dir):
+    """Write the matches of one file through every output sink, in full and streamed, and read them back.
+
+    Returns:
+    dict: For each output file name, True if it holds the same matches as the plain CSV output,
+        False if not, or the reason it could not be written.
+
+    """
+    expected_path = os.path.join(work_dir, "check-matches.csv")
+    match_to_file(marmat, metadata_path, lexicon_path, expected_path)
+    expected = read_match_file(marmat, expected_path)
+    results = {}
+    for suffix, package in (('.csv.gz', 'gzip'), ('.csv.zst', 'zstandard'), ('.parquet', 'pyarrow'),
+                            ('.arrow', 'pyarrow')):
+        if package != 'gzip' and getattr(marmat, package) is None:
+            results[suffix] = f"skipped, {package} is not installed"
+            continue
+        for chunk_size in (None, 1000):
+            output_file = os.path.join(work_dir, f"check-matches-{chunk_size or 'full'}{suffix}")
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            match_to_file(marmat, metadata_path, lexicon_path, output_file, chunk_size)
+            name = os.path.basename(output_file)
+            results[name] = os.path.exists(output_file) and read_match_file(marmat, output_file).equals(expected)
+    return results
+
+
+def check_mixed_identifiers(marmat, metadata_path, lexicon_path, work_dir):
+    """Stream a file whose identifiers are numbers in its first half and text after, into every Arrow sink.
+
+    Returns:
+    dict: For each output file name, True if it holds the same matches as the plain CSV output,
+        False if not, or the reason it could not be written.
+
+    """
+    if marmat.pyarrow is None:
+        return {'mixed identifiers': "skipped, pyarrow is not installed"}
+    import pandas as pd
+    mixed_path = os.path.join(work_dir, "check-mixed-ids.csv")
+    metadata_df = pd.read_csv(metadata_path, dtype=str, keep_default_na=False, encoding='latin1')
+    half = len(metadata_df) // 2
+    metadata_df.loc[half:, 'id'] = [f"A-{number}" for number in range(len(metadata_df) - half)]
+    metadata_df.to_csv(mixed_path, index=False, encoding='latin1')
+    expected_path = os.path.join(work_dir, "check-mixed-ids.csv.out.csv")
+    match_to_file(marmat, mixed_path, lexicon_path, expected_path)
+    expected = read_match_file(marmat, expected_path)
+    results = {}
+    for suffix in ('.parquet', '.arrow'):
+        output_file = os.path.join(work_dir, f"check-mixed-ids-1000{suffix}")
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        match_to_file(marmat, mixed_path, lexicon_path, output_file, chunk_size=1000)
+        results[os.path.basename(output_file)] = (os.path.exists(output_file)
+                                                  and read_match_file(marmat, output_file).equals(expected))
+    return results
+
+
+def check_late_encoding_error(marmat, lexicon_path, work_dir, rows):
+    """Match a file whose sampled start is UTF-8 but which has a Latin-1 byte further on, whole and streamed.
+
+    Returns:
+    dict: For the whole-file and the streamed read, True if the file is matched as it would be
+        when read as Latin-1 throughout.
+
+    """
+    metadata_path = os.path.join(work_dir, "check-late-latin1.csv")
+    sample, last_row = io.StringIO(), io.StringIO()
+    writer = csv.writer(sample)
+    writer.writerow(METADATA_COLUMNS)
+    seed = 0
+    while sample.tell() <= marmat.ENCODING_SAMPLE_BYTES:
+        writer.writerows(generate_metadata(rows, seed=seed))
+        seed += 1
+    csv.writer(last_row).writerow([0, 'Caf\xe9 ' + read_lexicon_terms()[0][0]] + [''] * (len(METADATA_COLUMNS) - 2))
+    with open(metadata_path, 'wb') as csv_file:
+        csv_file.write(sample.getvalue().encode('ascii', errors='ignore'))
+        csv_file.write(last_row.getvalue().encode('latin1'))
+
+    def matches(encoding):
+        tool = marmat.MaRMAT()
+        with contextlib.redirect_stdout(io.StringIO()):
+            tool.load_lexicon(lexicon_path)
+            tool.metadata_df = marmat.read_csv_file(metadata_path, encoding)
+        tool.select_identifier_column('id')
+        return list(tool.find_matches(MATCHED_COLUMNS, tool.lexicon_df['category'].unique().tolist()))
+
+    import pandas as pd
+    expected = matches('latin1')
+    streamed_path = os.path.join(work_dir, "check-late-latin1-matches.csv")
+    if os.path.exists(streamed_path):
+        os.remove(streamed_path)
+    match_to_file(marmat, metadata_path, lexicon_path, streamed_path, chunk_size=1000)
+    streamed = os.path.exists(streamed_path) and read_match_file(marmat, streamed_path).equals(
+        pd.DataFrame(expected, columns=marmat.MATCH_COLUMNS).astype(str))
+    return {
+        'Latin-1 byte past the encoding sample, whole file': matches(marmat.detect_encoding(metadata_path)) == expected,
+        'Latin-1 byte past the encoding sample, streamed': streamed,
+    }
+
+
+def run_checks(args):
+    """Check the readers and output sinks against plain CSV matching; exits non-zero on any failure."""
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="marmat-check-")
+    os.makedirs(work_dir, exist_ok=True)
+    metadata_path = os.path.join(work_dir, "check-metadata.csv")
+    lexicon_path = os.path.join(work_dir, "check-lexicon.csv")
+    write_metadata(metadata_path, args.rows)
+    write_lexicon(lexicon_path, args.terms)
+    marmat = load_marmat()
+
+    results = check_sinks(marmat, metadata_path, lexicon_path, work_dir)
+    results.update(check_mixed_identifiers(marmat, metadata_path, lexicon_path, work_dir))
+    results.update(check_late_encoding_error(marmat, lexicon_path, work_dir, args.rows))
+    failures = 0
+    for name, result in results.items():
+        print(f"{name}: {'OK' if result is True else 'FAILED' if result is False else result}")
+        failures += result is False
+    sys.exit(1 if failures else 0)
+
+
+def git_commit():
+    """Return the current git commit of the repository, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=CODE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args):
+    """Run every (rows, terms) case in its own process and write the results to JSON."""
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="marmat-benchmark-")
+    os.makedirs(work_dir, exist_ok=True)
+    cases = []
+    for rows in args.rows:
+        metadata_path = os.path.join(
+            work_dir, f"metadata-{rows}-{args.title_words}-{args.description_words}-{args.match_density}.csv")
+        if not os.path.exists(metadata_path):
+            print(f"Generating {rows} rows of metadata...")
+            write_metadata(metadata_path, rows, title_words=args.title_words,
+                           description_words=args.description_words, match_density=args.match_density)
+        for terms in args.terms:
+            lexicon_path = os.path.join(work_dir, f"lexicon-{terms}.csv")
+            if not os.path.exists(lexicon_path):
+                write_lexicon(lexicon_path, terms)
+            print(f"Matching {rows} rows against {terms} terms...")
+            # A fresh process per case keeps peak memory readings independent
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), 'case', metadata_path, lexicon_path,
+                                     '--workers', str(args.workers),
+                                     '--reference-budget', str(args.reference_budget)],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                print(result.stderr)
+                continue
+            case = json.loads(result.stdout.strip().splitlines()[-1])
+            case.update(title_words=args.title_words, description_words=args.description_words,
+                        match_density=args.match_density)
+            print(f"  {case['rows_per_second']} rows/s, {case['matches']} matches, "
+                  f"{case['peak_rss_mb']} MB peak, reference {'OK' if case['reference_equal'] else 'MISMATCH'}")
+            cases.append(case)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cases': cases,
+    }
+    with open(args.output, 'w', encoding='utf-8') as json_file:
+        json.dump(report, json_file, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+def compare(before_path, after_path):
+    """Print throughput and match-count differences between two result files."""
+    with open(before_path, encoding='utf-8') as json_file:
+        before = json.load(json_file)
+    with open(after_path, encoding='utf-8') as json_file:
+        after = json.load(json_file)
+
+    def key(case):
+        return (case['rows'], case['terms'], case['workers'], case.get('title_words'),
+                case.get('description_words'), case.get('match_density'))
+
+    before_cases = {key(case): case for case in before['cases']}
+    print(f"{'rows':>9} {'terms':>7} {before['commit'] or 'before':>12} {after['commit'] or 'after':>12} "
+          f"{'speedup':>8} {'peak MB':>15}  notes")
+    for case in after['cases']:
+        old = before_cases.get(key(case))
+        if old is None:
+            continue
+        notes = []
+        if old['matches'] != case['matches']:
+            notes.append(f"matches {old['matches']} -> {case['matches']}")
+        if not case['reference_equal']:
+            notes.append("differs from reference")
+        speedup = (case['rows_per_second'] / old['rows_per_second']
+                   if case['rows_per_second'] and old['rows_per_second'] else float('nan'))
+        print(f"{case['rows']:>9} {case['terms']:>7} {old['rows_per_second']:>12} {case['rows_per_second']:>12} "
+              f"{speedup:>7.2f}x {str(old['peak_rss_mb']) + ' -> ' + str(case['peak_rss_mb']):>15}  "
+              f"{'; '.join(notes)}")
+
+
+def integer_list(value):
+    """Parse a comma-separated list of integers such as "10000,100000"."""
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suite for the MaRMAT matching engine")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Run the benchmark cases and write a JSON report.")
+    run_parser.add_argument('--rows', type=integer_list, default=[10000, 100000, 1000000],
+                            help="Comma-separated metadata sizes (default: 10000,100000,1000000).")
+    run_parser.add_argument('--terms', type=integer_list, default=[100, 1000, 10000, 100000],
+                            help="Comma-separated lexicon sizes (default: 100,1000,10000,100000).")
+    run_parser.add_argument('--output', default='benchmark-results.json', help="Path of the JSON report.")
+    run_parser.add_argument('--work-dir', default=None, help="Directory for generated files (default: a temp dir).")
+    run_parser.add_argument('--workers', type=int, default=1, help="Number of processes to match in.")
+    run_parser.add_argument('--reference-budget', type=int, default=100000,
+                            help="Regex searches spent checking leading rows against the original loop.")
+
+    generate_parser = subparsers.add_parser('generate', help="Write synthetic metadata to a CSV file.")
+    generate_parser.add_argument('--rows', type=int, default=10000, help="Number of rows.")
+    generate_parser.add_argument('--output', required=True, help="Path of the metadata CSV file.")
+
+    for subparser in (run_parser, generate_parser):
+        subparser.add_argument('--title-words', type=int, default=8, help="Average words per title.")
+        subparser.add_argument('--description-words', type=int, default=35, help="Average words per description.")
+        subparser.add_argument('--match-density', type=float, default=0.1,
+                               help="Probability that a text cell contains a lexicon term.")
+
+    lexicon_parser = subparsers.add_parser('lexicon', help="Write a synthetic lexicon to a CSV file.")
+    lexicon_parser.add_argument('--terms', type=int, default=1000, help="Number of terms.")
+    lexicon_parser.add_argument('--output', required=True, help="Path of the lexicon CSV file.")
+
+    case_parser = subparsers.add_parser('case', help=argparse.SUPPRESS)
+    case_parser.add_argument('metadata')
+    case_parser.add_argument('lexicon')
+    case_parser.add_argument('--workers', type=int, default=1)
+    case_parser.add_argument('--reference-budget', type=int, default=100000)
+
+    check_parser = subparsers.add_parser('check', help="Check readers and output sinks against plain CSV matching.")
+    check_parser.add_argument('--rows', type=int, default=5000, help="Number of metadata rows.")
+    check_parser.add_argument('--terms', type=int, default=500, help="Number of lexicon terms.")
+    check_parser.add_argument('--work-dir', default=None, help="Directory for generated files (default: a temp dir).")
+
+    compare_parser = subparsers.add_parser('compare', help="Compare two JSON reports.")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run_suite(args)
+    elif args.command == 'generate':
+        write_metadata(args.output, args.rows, title_words=args.title_words,
+                       description_words=args.description_words, match_density=args.match_density)
+        print(f"Metadata saved to {args.output}")
+    elif args.command == 'lexicon':
+        write_lexicon(args.output, args.terms)
+        print(f"Lexicon saved to {args.output}")
+    elif args.command == 'case':
+        print(json.dumps(run_case(args.metadata, args.lexicon, args.workers, args.reference_budget)))
+    elif args.command == 'compare':
+        compare(args.before, args.after)
+    elif args.command == 'check':
+        run_checks(args)
@@ -1,8 +1,25 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
+import itertools
+import os
+import numpy as np
 import pandas as pd
-import re
+import queue
 import threading
+import time
+
+import marmat  # The matching engine shared with the command-line tool, in MarMAT-CommandLine-2.6.py
+
+PROGRESS_BLOCK_ROWS = 5000  # Rows matched between progress updates
+SNIPPET_WIDTH = 40  # Default characters of context kept on each side of a match in snippet output
+
+
+def make_snippet(text, start, end, width=SNIPPET_WIDTH):
+    """Return text[start:end] with at most `width` characters of context on each side, with "..." where text was cut."""
+    left = max(0, start - width)
+    right = min(len(text), end + width)
+    return ('...' if left > 0 else '') + text[left:right] + ('...' if right < len(text) else '')
+
 
 class MaRMAT(tk.Tk):
     def __init__(self):
@@ -11,11 +28,15 @@ class MaRMAT(tk.Tk):
         
         # Initialize variables
         self.lexicon_df = None
+        self.metadata_reader = None  # Metadata columns are parsed only once they are selected for matching
         self.metadata_df = None
         self.columns = []
         self.categories = []
         self.selected_columns = []
         self.identifier_column = None
+        self.scans_saved = 0
+        self.matcher = None  # Compiled from every lexicon category
+        self.match_index = {}  # Column -> [(row position, matched entry indices)] for every category
         
         # Create main frame
         self.main_frame = ttk.Frame(self)
@@ -66,7 +87,8 @@ class MaRMAT(tk.Tk):
         file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
         if file_path:
             try:
-                self.lexicon_df = pd.read_csv(file_path, encoding='latin1')
+                self.lexicon_df = marmat.read_csv_file(file_path, marmat.detect_encoding(file_path))
+                self.clear_match_index()
                 messagebox.showinfo("Success", "Lexicon loaded successfully.")
                 self.load_lexicon_button.config(state='disabled')
             except Exception as e:
@@ -76,7 +98,11 @@ class MaRMAT(tk.Tk):
         file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
         if file_path:
             try:
-                self.metadata_df = pd.read_csv(file_path, encoding='latin1')
+                # Only the header is read here; the encoding is sniffed from the start of the file
+                self.metadata_reader = marmat.metadata_reader(file_path)
+                self.columns = self.metadata_reader.columns()
+                self.metadata_df = None
+                self.clear_match_index()
                 messagebox.showinfo("Success", "Metadata loaded successfully.")
                 self.load_metadata_button.config(state='disabled')
                 self.next_button.grid()
@@ -84,12 +110,11 @@ class MaRMAT(tk.Tk):
                 messagebox.showerror("Error", f"An error occurred while loading metadata: {e}")
     
     def show_column_selection(self):
-        if self.lexicon_df is None or self.metadata_df is None:
+        if self.lexicon_df is None or self.metadata_reader is None:
             messagebox.showwarning("Warning", "Please load lexicon and metadata files first.")
             return
         
         # Populate columns listbox
-        self.columns = self.metadata_df.columns.tolist()
         self.column_selection_frame = ttk.Frame(self)
         self.column_selection_frame.grid(row=0, column=0, padx=20, pady=20, sticky="nsew")
         
@@ -128,7 +153,7 @@ class MaRMAT(tk.Tk):
         self.identifier_var = tk.StringVar()
         self.identifier_dropdown = ttk.Combobox(self.identifier_selection_frame, textvariable=self.identifier_var, state='readonly')
         self.identifier_dropdown.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
-        self.identifier_dropdown['values'] = self.metadata_df.columns.tolist()  # Show all columns as options
+        self.identifier_dropdown['values'] = self.columns  # Show all columns as options
         self.identifier_dropdown.current(0)  # Select first column by default
         
         self.next_button_identifier = ttk.Button(self.identifier_selection_frame, text="Next", command=self.show_category_selection)
@@ -158,11 +183,31 @@ class MaRMAT(tk.Tk):
         self.all_categories_checkbox = ttk.Checkbutton(self.category_selection_frame, text="All", variable=self.all_categories_var, command=self.toggle_categories)
         self.all_categories_checkbox.grid(row=2, column=0, padx=10, pady=5, sticky="w")
         
+        # How the matched cell text is written: on every match, once in a separate table, or as snippets
+        self.output_frame = ttk.LabelFrame(self.category_selection_frame, text="Output")
+        self.output_frame.grid(row=3, column=0, padx=10, pady=5, sticky="nsew")
+        self.output_mode_var = tk.StringVar(value='full')
+        ttk.Radiobutton(self.output_frame, text="Original text on every match", variable=self.output_mode_var, value='full').grid(row=0, column=0, columnspan=2, padx=5, sticky="w")
+        ttk.Radiobutton(self.output_frame, text="Original text in a separate table (smaller files)", variable=self.output_mode_var, value='table').grid(row=1, column=0, columnspan=2, padx=5, sticky="w")
+        ttk.Radiobutton(self.output_frame, text="Snippet around each match", variable=self.output_mode_var, value='snippet').grid(row=2, column=0, columnspan=2, padx=5, sticky="w")
+        ttk.Label(self.output_frame, text="Characters of context:").grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        self.snippet_width_var = tk.IntVar(value=SNIPPET_WIDTH)
+        ttk.Spinbox(self.output_frame, from_=0, to=1000, width=6, textvariable=self.snippet_width_var).grid(row=3, column=1, padx=5, pady=5, sticky="w")
+        
         self.next_button_categories = ttk.Button(self.category_selection_frame, text="Perform Matching", command=self.perform_matching)
-        self.next_button_categories.grid(row=3, column=0, padx=10, pady=10, sticky="nsew")
+        self.next_button_categories.grid(row=4, column=0, padx=10, pady=10, sticky="nsew")
         
         self.back_button_categories = ttk.Button(self.category_selection_frame, text="Back", command=self.back_to_identifier_selection)
-        self.back_button_categories.grid(row=4, column=0, padx=10, pady=10, sticky="nsew")
+        self.back_button_categories.grid(row=5, column=0, padx=10, pady=10, sticky="nsew")
+        
+        # Progress widgets, shown while matching runs in the background
+        self.progress_bar = ttk.Progressbar(self.category_selection_frame, mode='determinate', length=300)
+        self.progress_bar.grid(row=6, column=0, padx=10, pady=5, sticky="nsew")
+        self.progress_label = ttk.Label(self.category_selection_frame, text="", justify='left')
+        self.progress_label.grid(row=7, column=0, padx=10, pady=5, sticky="w")
+        self.cancel_button = ttk.Button(self.category_selection_frame, text="Cancel", command=self.cancel_matching)
+        self.cancel_button.grid(row=8, column=0, padx=10, pady=10, sticky="nsew")
+        self.show_progress(False)
     
     def perform_matching(self):
         selected_categories = self.get_selected_categories()
@@ -170,18 +215,137 @@ class MaRMAT(tk.Tk):
             messagebox.showwarning("Warning", "Please select at least one category.")
             return
         
-        matches = self.find_matches(self.selected_columns, selected_categories)
-        matches_filtered = [(identifier, term, category, col, text) for identifier, term, category, col, text in matches if col in self.selected_columns]
+        # Read and match on a worker thread so the window keeps responding; poll_progress picks up its messages
+        self.next_button_categories.config(state='disabled')
+        self.back_button_categories.config(state='disabled')
+        self.progress_bar.config(maximum=1, value=0)  # Sized once the metadata has been read
+        self.progress_label.config(text="Starting...")
+        self.cancel_button.config(state='normal')
+        self.show_progress(True)
+        self.progress_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.matching_thread = threading.Thread(target=self.run_matching, args=(selected_categories,), daemon=True)
+        self.matching_thread.start()
+        self.after(100, self.poll_progress)
+    
+    def run_matching(self, selected_categories):
+        # Runs on the worker thread: never touch Tk widgets here, only the queue
+        try:
+            self.progress_queue.put(('reading',))
+            self.read_metadata_columns(self.selected_columns + [self.identifier_column])
+        except Exception as e:
+            self.progress_queue.put(('load error', e))
+            return
+        self.progress_queue.put(('read', len(self.metadata_df)))
+        try:
+            matches = self.find_matches(self.selected_columns, selected_categories, self.progress_queue, self.cancel_event)
+            if matches is None:
+                self.progress_queue.put(('cancelled',))
+            else:
+                self.progress_queue.put(('done', matches))
+        except Exception as e:
+            self.progress_queue.put(('error', e))
+    
+    def poll_progress(self):
+        try:
+            while True:
+                message = self.progress_queue.get_nowait()
+                if message[0] == 'reading':
+                    self.progress_label.config(text="Reading metadata...")
+                    continue
+                if message[0] == 'read':
+                    self.progress_bar.config(maximum=max(message[1], 1))
+                    self.progress_label.config(text="Starting...")
+                    continue
+                if message[0] == 'progress':
+                    rows_done, matches_found, elapsed = message[1:]
+                    total_rows = len(self.metadata_df)
+                    rate = rows_done / elapsed if elapsed > 0 else 0
+                    eta = self.format_duration((total_rows - rows_done) / rate) if rate else "unknown"
+                    self.progress_bar.config(value=rows_done)
+                    self.progress_label.config(text=f"Processed {rows_done:,} of {total_rows:,} rows ({rate:,.0f} rows/sec)\n"
+                                                    f"{matches_found:,} matches found, about {eta} remaining")
+                    continue
+                self.show_progress(False)
+                self.next_button_categories.config(state='normal')
+                self.back_button_categories.config(state='normal')
+                if message[0] == 'done':
+                    self.save_matches(message[1])
+                elif message[0] == 'cancelled':
+                    messagebox.showinfo("Cancelled", "Matching was cancelled.")
+                elif message[0] == 'load error':
+                    messagebox.showerror("Error", f"An error occurred while loading metadata: {message[1]}")
+                else:
+                    messagebox.showerror("Error", f"An error occurred while matching: {message[1]}")
+                return
+        except queue.Empty:
+            pass
+        self.after(100, self.poll_progress)
+    
+    def cancel_matching(self):
+        self.cancel_event.set()
+        self.cancel_button.config(state='disabled')
+        self.progress_label.config(text="Cancelling...")
+    
+    def show_progress(self, visible):
+        for widget in (self.progress_bar, self.progress_label, self.cancel_button):
+            if visible:
+                widget.grid()
+            else:
+                widget.grid_remove()
+    
+    @staticmethod
+    def format_duration(seconds):
+        seconds = int(round(seconds))
+        if seconds >= 3600:
+            return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+        if seconds >= 60:
+            return f"{seconds // 60}m {seconds % 60:02d}s"
+        return f"{seconds}s"
+    
+    def save_matches(self, matches):
+        matches_filtered = [match for match in matches if match[3] in self.selected_columns]
         output_file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
         if output_file_path:
             try:
-                matches_df = pd.DataFrame(matches_filtered, columns=['Identifier', 'Term', 'Category', 'Column', 'Original Text'])
-                matches_df.to_csv(output_file_path, index=False)
-                messagebox.showinfo("Success", f"Merged data saved to: {output_file_path}")
-                self.reset()
+                saved_files = self.write_matches(matches_filtered, output_file_path, self.output_mode_var.get(), self.snippet_width_var.get())
+                messagebox.showinfo("Success", f"Merged data saved to: {', '.join(saved_files)}\n\n"
+                                               f"Repeated values skipped: {self.scans_saved} cell scans saved.\n\n"
+                                               f"Matches are kept in memory: choose other categories or columns "
+                                               f"and export again without rescanning.")
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred while saving file: {e}")
     
+    def write_matches(self, matches, output_file_path, output_mode='full', snippet_width=SNIPPET_WIDTH):
+        # Returns the paths written. 'full' repeats the cell text on every match; 'table' writes the
+        # matches with a (Row, Column) key plus one "-text" file holding each matched cell once, keyed
+        # by row so repeated identifiers stay apart; 'snippet' keeps only `snippet_width` characters
+        # either side of each match
+        columns = ['Identifier', 'Term', 'Category', 'Column']
+        if output_mode == 'table':
+            matches_df = pd.DataFrame(matches, columns=columns + ['Original Text', 'Row'])
+            text_file_path = '{}-text{}'.format(*os.path.splitext(output_file_path))
+            matches_df[['Row'] + columns].to_csv(output_file_path, index=False)
+            text_df = matches_df[['Row', 'Identifier', 'Column', 'Original Text']].drop_duplicates(['Row', 'Column'])
+            text_df.to_csv(text_file_path, index=False)
+            return [output_file_path, text_file_path]
+        if output_mode == 'snippet':
+            matches = [match[:4] + (snippet,) for match, snippet in zip(matches, self.snippets(matches, snippet_width))]
+            pd.DataFrame(matches, columns=columns + ['Snippet']).to_csv(output_file_path, index=False)
+            return [output_file_path]
+        pd.DataFrame([match[:5] for match in matches], columns=columns + ['Original Text']).to_csv(output_file_path, index=False)
+        return [output_file_path]
+    
+    def snippets(self, matches, width=SNIPPET_WIDTH):
+        # The text around the first whole-word occurrence of each match's term in its cell;
+        # matches of one cell are consecutive, so each cell is located in one call
+        snippets = []
+        for text, cell_matches in itertools.groupby(matches, key=lambda match: match[4]):
+            terms = [match[1] for match in cell_matches]
+            for start, end in self.matcher.spans(text, terms):
+                snippets.append(make_snippet(text, start, end, width))
+        return snippets
+    
     def toggle_columns(self):
         if self.all_columns_var.get():
             self.column_listbox.selection_set(0, tk.END)
@@ -207,20 +371,108 @@ class MaRMAT(tk.Tk):
     def get_selected_categories(self):
         return [self.categories[i] for i in self.category_listbox.curselection()]
 
-    def find_matches(self, selected_columns, selected_categories):
-        matches = []
-        lexicon_df = self.lexicon_df[self.lexicon_df['category'].isin(selected_categories)]
+    def find_matches(self, selected_columns, selected_categories, progress_queue=None, cancel_event=None):
+        # Returns (identifier, term, category, column, original text, row number) tuples, rows numbered
+        # from 1 in metadata order; or None if cancel_event is set before every block has been matched
+        # Every category is matched once per column and kept in self.match_index; later selections only filter it
+        if self.matcher is None:
+            self.matcher = marmat.LexiconMatcher(self.lexicon_df['term'], self.lexicon_df['category'])
+        new_columns = [col for col in selected_columns if col not in self.match_index]
+        if new_columns:
+            new_index = self.index_columns(new_columns, progress_queue, cancel_event)
+            if new_index is None:
+                return None
+            self.match_index.update(new_index)
 
-        for index, row in self.metadata_df.iterrows():
-            for col in selected_columns:
-                if isinstance(row[col], str):
-                    for term, category in zip(lexicon_df['term'], lexicon_df['category']):
-                        # Check for multiple matches of terms within a single metadata cell
-                        if re.search(r'\b' + re.escape(term.lower()) + r'\b', row[col].lower()):
-                            matches.append((row[self.identifier_column], term, category, col, row[col]))
+        wanted = set(selected_categories)
+        selected_entries = [category in wanted for term, category in self.matcher.entries]
+        hits = []  # (row position, column position, matched entry indices)
+        for col_position, col in enumerate(selected_columns):
+            for row_position, entries in self.match_index[col]:
+                entries = [index for index in entries if selected_entries[index]]
+                if entries:
+                    hits.append((row_position, col_position, entries))
+
+        # Report matches row by row, as the original row-by-row loop did
+        hits.sort(key=lambda hit: (hit[0], hit[1]))
+        identifiers = self.metadata_df[self.identifier_column].tolist()
+        columns = {col: self.metadata_df[col] for col in selected_columns}
+        matches = []
+        for row_position, col_position, entries in hits:
+            col = selected_columns[col_position]
+            original_text = columns[col].iat[row_position]
+            for index in entries:
+                term, category = self.matcher.entries[index]
+                matches.append((identifiers[row_position], term, category, col, original_text, row_position + 1))
 
         return matches
     
+    def index_columns(self, columns, progress_queue=None, cancel_event=None):
+        # Returns {column: [(row position, matched entry indices)]}, or None if cancelled
+        index = {col: [] for col in columns}
+        known = {col: {} for col in columns}  # Normalized value -> matched entry indices, per column
+        total_rows = len(self.metadata_df)
+        found = 0
+        start = time.perf_counter()
+        for block_start in range(0, total_rows, PROGRESS_BLOCK_ROWS):
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            block = self.metadata_df.iloc[block_start:block_start + PROGRESS_BLOCK_ROWS]
+            # Blocks are matched in order, so each column's hits stay in row order
+            for row_position, col_position, entries in self.match_block(self.matcher, block, columns, known):
+                index[columns[col_position]].append((block_start + row_position, entries))
+                found += len(entries)
+            if progress_queue is not None:
+                rows_done = min(block_start + PROGRESS_BLOCK_ROWS, total_rows)
+                progress_queue.put(('progress', rows_done, found, time.perf_counter() - start))
+
+        return index
+    
+    def read_metadata_columns(self, columns):
+        # Parse the given metadata columns that have not been read yet and add them to self.metadata_df
+        missing = [col for col in dict.fromkeys(columns) if self.metadata_df is None or col not in self.metadata_df.columns]
+        if missing:
+            new_columns = self.metadata_reader.read(usecols=missing)
+            self.metadata_df = new_columns if self.metadata_df is None else pd.concat([self.metadata_df, new_columns], axis=1)
+    
+    def clear_match_index(self):
+        self.matcher = None
+        self.match_index = {}
+        self.scans_saved = 0
+    
+    def match_block(self, matcher, block, selected_columns, known):
+        # Returns (row position within the block, column position, matched entry indices), column by column
+        hits = []
+
+        # Scan one whole column at a time rather than building a Series for every row
+        for col_position, col in enumerate(selected_columns):
+            column = block[col]
+            if not (pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column)):
+                continue
+            # Match each distinct value once, then fan its hits out to every row that shares it
+            codes, uniques = pd.factorize(column)
+            normalized = matcher.normalizer.normalize_values(uniques)
+            is_text = normalized.notna().to_numpy()
+            seen = known[col]
+            unique_entries = [None] * len(uniques)
+            new_positions, new_texts = [], []
+            for unique_position, text in zip(is_text.nonzero()[0].tolist(), normalized[is_text].tolist()):
+                if text in seen:
+                    unique_entries[unique_position] = seen[text]
+                else:
+                    new_positions.append(unique_position)
+                    new_texts.append(text)
+            words = pd.Series(new_texts, dtype=object).str.findall(marmat.WORD_PATTERN).tolist()
+            for unique_position, text, text_words in zip(new_positions, new_texts, words):
+                # A single lookup reports every lexicon term found within the metadata cell
+                unique_entries[unique_position] = seen[text] = matcher.find_in_words(text, text_words)
+            self.scans_saved += int(np.count_nonzero(is_text[codes[codes >= 0]])) - len(new_texts)
+            has_hits = np.array([bool(entries) for entries in unique_entries] + [False])
+            for row_position in np.flatnonzero(has_hits[codes]).tolist():
+                hits.append((row_position, col_position, unique_entries[codes[row_position]]))
+
+        return hits
+    
     def back_to_main_frame(self):
         self.column_selection_frame.grid_remove()
         self.main_frame.grid()
@@ -237,11 +489,13 @@ class MaRMAT(tk.Tk):
         self.load_lexicon_button.config(state='normal')
         self.load_metadata_button.config(state='normal')
         self.lexicon_df = None
+        self.metadata_reader = None
         self.metadata_df = None
         self.columns = []
         self.categories = []
         self.selected_columns = []
         self.identifier_column = None
+        self.clear_match_index()
         self.next_button.grid_remove()
         self.explanation_label.grid()
 
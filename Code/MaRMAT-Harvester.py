@@ -0,0 +1,464 @@
+"""Concurrent OAI-PMH harvester for MaRMAT.
+
+Harvests ListRecords responses straight from a repository's OAI-PMH endpoint instead of downloading
+CSV exports by hand. Each set is paged through with its resumption tokens while several sets are
+fetched at once, over a bounded number of connections and with retries. Every page is written to
+disk as soon as it arrives, and its records are matched by the MaRMAT engine in
+MarMAT-CommandLine-2.6.py while the next page is being fetched.
+
+Usage:
+    python3 MaRMAT-Harvester.py https://example.org/oai --set uum_map --metadata-prefix qdc \\
+        --lexicon lexicon-reparative-metadata.csv --columns title,subject,description
+
+For testing, the script can also stand in for an OAI-PMH endpoint, serving the records of saved
+ListRecords files (such as "XML Test Code/Sample Data/oai_uum_map.xml") in pages:
+    python3 MaRMAT-Harvester.py --serve-fixtures "../XML Test Code/Sample Data/oai_uum_map.xml"
+"""
+
+import argparse
+import asyncio
+import html
+import io
+import os
+import re
+import sys
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import marmat  # The matching engine in MarMAT-CommandLine-2.6.py
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 300  # Seconds; longer Retry-After values are capped
+RESUMPTION_TOKEN_PATTERN = re.compile(
+    rb'<(?:\w+:)?resumptionToken\b[^>]*?(?:/>|>([^<]*)</(?:\w+:)?resumptionToken>)')
+ERROR_PATTERN = re.compile(rb'<(?:\w+:)?error\b[^>]*?\bcode="([^"]*)"[^>]*?(?:/>|>([^<]*)<)')
+OAI_NAMESPACES = {
+    '': 'http://www.openarchives.org/OAI/2.0/',
+    'qdc': 'http://worldcat.org/xmlschemas/qdc-1.0/',
+    'dcterms': 'http://purl.org/dc/terms/',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+}
+
+
+class OAIError(Exception):
+    """An error reported by the OAI-PMH endpoint in a response body."""
+
+
+def resumption_token(page):
+    """Return the resumption token of a ListRecords page, or None on the last page.
+
+    Parameters:
+    page (bytes): The response body.
+
+    Returns:
+    str: The token, or None if the page has no token or an empty one.
+
+    """
+    found = RESUMPTION_TOKEN_PATTERN.search(page)
+    if found is None or not found.group(1):
+        return None
+    token = html.unescape(found.group(1).decode('utf-8')).strip()
+    return token or None
+
+
+def oai_error(page):
+    """Return the (code, message) of an OAI-PMH error response, or None for a normal response."""
+    found = ERROR_PATTERN.search(page)
+    if found is None:
+        return None
+    return found.group(1).decode('utf-8'), html.unescape((found.group(2) or b'').decode('utf-8')).strip()
+
+
+def page_file_name(set_spec, page_number):
+    """Name the file a harvested page is saved to, e.g. "uum_map-00001.xml"."""
+    name = re.sub(r'[^\w.-]+', '_', set_spec) if set_spec else 'all'
+    return f"{name}-{page_number:05d}.xml"
+
+
+class OAIHarvester:
+    """Harvests ListRecords pages from an OAI-PMH endpoint, several sets at a time."""
+
+    def __init__(self, base_url, output_dir, metadata_prefix='oai_dc', connections=4, retries=3, backoff=1.0,
+                 timeout=60):
+        """Set up the harvester.
+
+        Parameters:
+        base_url (str): The OAI-PMH endpoint, e.g. "https://example.org/oai".
+        output_dir (str): Directory in which every page is saved.
+        metadata_prefix (str): Metadata format to request, e.g. "oai_dc" or "qdc".
+        connections (int): Most requests in flight at once, across all sets.
+        retries (int): Times a failed request is retried before its set is given up.
+        backoff (float): Seconds before the first retry; doubled for each further retry, unless the
+            endpoint sends Retry-After.
+        timeout (float): Seconds to wait for a response.
+
+        """
+        self.base_url = base_url
+        self.output_dir = output_dir
+        self.metadata_prefix = metadata_prefix
+        self.connections = connections
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.semaphore = None  # Created in `harvest`, inside the running event loop
+        self.requests = 0
+        self.retried = 0
+        self.pages = 0
+
+    def get(self, params):
+        """Send one request and return the response body (blocking; run on a worker thread)."""
+        url = self.base_url + ('&' if '?' in self.base_url else '?') + urllib.parse.urlencode(params)
+        request = urllib.request.Request(url, headers={'User-Agent': 'MaRMAT-Harvester'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    async def fetch(self, params):
+        """Fetch one page, holding a connection slot while the request is in flight and retrying failures.
+
+        Parameters:
+        params (dict): Query parameters of the OAI-PMH request.
+
+        Returns:
+        bytes: The response body.
+
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.semaphore:
+                    self.requests += 1
+                    return await asyncio.to_thread(self.get, params)
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRY_STATUS_CODES or attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                retry_after = e.headers.get('Retry-After', '') if e.headers else ''
+                if retry_after.isdigit():
+                    delay = min(int(retry_after), MAX_RETRY_AFTER)
+                reason = f"HTTP {e.code}"
+            except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                reason = str(getattr(e, 'reason', e))
+            self.retried += 1
+            print(f"Request failed ({reason}); retrying in {delay:g} s.")
+            await asyncio.sleep(delay)
+
+    async def harvest_set(self, set_spec=None, on_page=None):
+        """Harvest every page of one set, following its resumption tokens.
+
+        The request for the next page is sent before the current page is saved and handed to
+        `on_page`, so fetching and matching overlap.
+
+        Parameters:
+        set_spec (str): The set to harvest; None harvests the whole repository.
+        on_page (callable): Called as on_page(set_spec, file_path, page) with each page once it is saved.
+
+        Returns:
+        int: Number of pages harvested.
+
+        """
+        params = {'verb': 'ListRecords', 'metadataPrefix': self.metadata_prefix}
+        if set_spec:
+            params['set'] = set_spec
+        pending = asyncio.create_task(self.fetch(params))
+        page_number = 0
+        try:
+            while pending is not None:
+                page = await pending
+                pending = None
+                error = oai_error(page)
+                if error is not None:
+                    if error[0] == 'noRecordsMatch':
+                        break
+                    raise OAIError(f"{error[0]}: {error[1]}")
+                token = resumption_token(page)
+                if token is not None:
+                    pending = asyncio.create_task(self.fetch({'verb': 'ListRecords', 'resumptionToken': token}))
+                page_number += 1
+                file_path = os.path.join(self.output_dir, page_file_name(set_spec, page_number))
+                with open(file_path, 'wb') as page_file:
+                    page_file.write(page)
+                self.pages += 1
+                if on_page is not None:
+                    on_page(set_spec, file_path, page)
+        finally:
+            if pending is not None:
+                pending.cancel()
+        return page_number
+
+    async def harvest(self, sets=None, on_page=None):
+        """Harvest several sets concurrently.
+
+        Parameters:
+        sets (list of str): Sets to harvest; None or empty harvests the whole repository.
+        on_page (callable): Passed to `harvest_set`.
+
+        Returns:
+        int: Number of sets that could not be harvested completely.
+
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.semaphore = asyncio.Semaphore(self.connections)
+        sets = list(sets) if sets else [None]
+        results = await asyncio.gather(*(self.harvest_set(set_spec, on_page) for set_spec in sets),
+                                       return_exceptions=True)
+        failures = 0
+        for set_spec, result in zip(sets, results):
+            label = set_spec or 'the repository'
+            if isinstance(result, BaseException):
+                failures += 1
+                print(f"An error occurred while harvesting {label}: {result}")
+            else:
+                print(f"Harvested {result} pages of {label}.")
+        return failures
+
+
+class PageMatcher:
+    """Matches the records of each harvested page and appends the matches to one output file."""
+
+    def __init__(self, tool, selected_columns, identifier_column, selected_categories, output_file, headings=False,
+                 chunk_size=marmat.BATCH_CHUNK_SIZE):
+        """Compile the lexicon once for every page.
+
+        Parameters:
+        tool (MaRMAT): Tool with its lexicon loaded.
+        selected_columns (list of str): Record fields to match, e.g. ['title', 'subject'].
+        identifier_column (str): Record field identifying each record, e.g. 'oai_identifier'.
+        selected_categories (list of str): Lexicon categories to match.
+        output_file (str): Path to the output file; ".parquet", ".arrow" and ".csv.gz" pick other formats.
+        headings (bool): Match the fields as LCSH subject headings.
+        chunk_size (int): Most records of a page matched at a time.
+
+        """
+        self.matcher = tool.compile_matcher(selected_categories, headings=headings)
+        self.selected_columns = selected_columns
+        self.identifier_column = identifier_column
+        self.needed_columns = list(dict.fromkeys(selected_columns + [identifier_column]))
+        self.chunk_size = chunk_size
+        self.sink = marmat.match_sink(output_file, tool.output_columns(headings))
+        self.records = 0
+        self.matches = 0
+
+    def __call__(self, set_spec, file_path, page):
+        records = marmat.iter_oai_records(io.BytesIO(page))
+        for chunk in marmat.record_chunks(records, self.needed_columns, self.chunk_size):
+            matches = marmat.match_columns(self.matcher, chunk, self.selected_columns, self.identifier_column)
+            self.sink.write(matches)
+            self.records += len(chunk)
+            self.matches += len(matches)
+
+    def close(self):
+        """Close the output file and return its path."""
+        return self.sink.close()
+
+
+class FixtureStore:
+    """Records of saved ListRecords files, served in pages by the stand-in endpoint."""
+
+    def __init__(self, fixture_paths, page_size=100, failures=0):
+        """Read the fixtures.
+
+        Parameters:
+        fixture_paths (list of str): OAI-PMH XML files, e.g. ListRecords responses.
+        page_size (int): Records per page.
+        failures (int): Number of requests to answer with "503 Service Unavailable" first, to
+            exercise the harvester's retries.
+
+        """
+        for prefix, uri in OAI_NAMESPACES.items():
+            ET.register_namespace(prefix, uri)
+        self.page_size = page_size
+        self.failures = failures
+        self.sets = {}  # setSpec -> serialized records, in file order
+        oai = '{' + OAI_NAMESPACES[''] + '}'
+        for fixture_path in fixture_paths:
+            for record in ET.parse(fixture_path).getroot().iter(oai + 'record'):
+                record_xml = ET.tostring(record, encoding='unicode').strip()
+                self.sets.setdefault('', []).append(record_xml)
+                for set_spec in record.iterfind(f'{oai}header/{oai}setSpec'):
+                    self.sets.setdefault(set_spec.text, []).append(record_xml)
+
+    def list_records(self, params):
+        """Answer a ListRecords request.
+
+        Parameters:
+        params (dict): The request's query parameters.
+
+        Returns:
+        str: The response body.
+
+        """
+        if 'resumptionToken' in params:
+            set_spec, _, offset = params['resumptionToken'].rpartition(':')
+            if set_spec not in self.sets or not offset.isdigit():
+                return self.error('badResumptionToken', 'The resumption token is not valid.')
+            offset = int(offset)
+        elif 'metadataPrefix' not in params:
+            return self.error('badArgument', 'metadataPrefix is required.')
+        else:
+            set_spec, offset = params.get('set', ''), 0
+        records = self.sets.get(set_spec)
+        if not records:
+            return self.error('noRecordsMatch', 'No records match the request.')
+        page = records[offset:offset + self.page_size]
+        next_offset = offset + len(page)
+        if next_offset < len(records):
+            token = html.escape(f"{set_spec}:{next_offset}")
+        else:
+            token = ''
+        return self.response(''.join(page) + f'<resumptionToken completeListSize="{len(records)}" '
+                                              f'cursor="{offset}">{token}</resumptionToken>')
+
+    def response(self, body, verb='ListRecords'):
+        """Wrap `body` in an OAI-PMH response."""
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                f'<OAI-PMH xmlns="{OAI_NAMESPACES[""]}"><request verb="{verb}">stand-in</request>'
+                f'<{verb}>{body}</{verb}></OAI-PMH>')
+
+    def error(self, code, message):
+        """Return an OAI-PMH error response."""
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                f'<OAI-PMH xmlns="{OAI_NAMESPACES[""]}"><request>stand-in</request>'
+                f'<error code="{code}">{html.escape(message)}</error></OAI-PMH>')
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Answers ListRecords requests from the server's `FixtureStore`."""
+
+    def do_GET(self):
+        store = self.server.store
+        with self.server.lock:
+            fail = store.failures > 0
+            if fail:
+                store.failures -= 1
+        if fail:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+        if params.get('verb') == 'ListRecords':
+            body = store.list_records(params)
+        else:
+            body = store.error('badVerb', 'Only ListRecords is supported by the stand-in endpoint.')
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_fixture_server(fixture_paths, host='127.0.0.1', port=8766, page_size=100, failures=0, verbose=False):
+    """Create (but do not start) a stand-in OAI-PMH endpoint serving saved records.
+
+    Parameters:
+    fixture_paths (list of str): OAI-PMH XML files whose records are served.
+    host (str): Address to listen on.
+    port (int): Port to listen on; 0 picks a free port.
+    page_size (int): Records per ListRecords page.
+    failures (int): Number of requests to answer with 503 first.
+    verbose (bool): Log every request.
+
+    Returns:
+    ThreadingHTTPServer: The server; call `serve_forever()` to run it.
+
+    """
+    server = ThreadingHTTPServer((host, port), FixtureHandler)
+    server.daemon_threads = True
+    server.store = FixtureStore(fixture_paths, page_size, failures)
+    server.lock = threading.Lock()
+    server.verbose = verbose
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Harvest OAI-PMH records and match them with MaRMAT.")
+    parser.add_argument("url", nargs="?", help="The OAI-PMH endpoint to harvest.")
+    parser.add_argument("--set", action="append", default=None,
+                        help="Set to harvest; repeat it to harvest several sets at once (default: every record).")
+    parser.add_argument("--metadata-prefix", default="oai_dc",
+                        help="Metadata format to request, e.g. oai_dc or qdc (default: oai_dc).")
+    parser.add_argument("--output-dir", default="harvest",
+                        help="Directory in which every harvested page is saved (default: harvest).")
+    parser.add_argument("--connections", type=int, default=4,
+                        help="Most requests in flight at once (default: 4).")
+    parser.add_argument("--retries", type=int, default=3,
+                        help="Times a failed request is retried (default: 3).")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for a response (default: 60).")
+    parser.add_argument("--lexicon", action="append", default=None,
+                        help="Lexicon CSV file to match the harvested records against; repeat it, optionally as "
+                             "NAME=PATH, for several lexicons. Without it, pages are only saved.")
+    parser.add_argument("--columns", default="title,subject,description",
+                        help="Comma-separated record fields to match (default: title,subject,description).")
+    parser.add_argument("--identifier", default="oai_identifier",
+                        help="Record field used as the identifier (default: oai_identifier).")
+    parser.add_argument("--categories", default=None, help="Comma-separated lexicon categories (default: all).")
+    parser.add_argument("--output", default="harvest-matches.csv",
+                        help="File for the matches: CSV, .csv.gz, .csv.zst, .parquet or .arrow "
+                             "(default: harvest-matches.csv).")
+    parser.add_argument("--headings", action="store_true",
+                        help="Match as LCSH subject headings (exact and broad matches).")
+    parser.add_argument("--fold-diacritics", action="store_true", help="Ignore accents when matching.")
+    parser.add_argument("--cache-dir", default=None, help="Directory in which to cache compiled lexicons.")
+    parser.add_argument("--serve-fixtures", nargs="+", default=None, metavar="XML_FILE",
+                        help="Instead of harvesting, serve the records of these OAI-PMH XML files as a stand-in "
+                             "endpoint, for testing.")
+    parser.add_argument("--port", type=int, default=8766, help="Port of the stand-in endpoint (default: 8766).")
+    parser.add_argument("--page-size", type=int, default=100,
+                        help="Records per page of the stand-in endpoint (default: 100).")
+    parser.add_argument("--fail-first", type=int, default=0,
+                        help="Answer this many requests to the stand-in endpoint with 503 first, to test retries.")
+    args = parser.parse_args()
+
+    if args.serve_fixtures:
+        server = make_fixture_server(args.serve_fixtures, port=args.port, page_size=args.page_size,
+                                     failures=args.fail_first, verbose=True)
+        print(f"Stand-in OAI-PMH endpoint listening on http://127.0.0.1:{server.server_address[1]}/oai")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        sys.exit(0)
+
+    if not args.url:
+        parser.error("the OAI-PMH endpoint URL is required")
+    page_matcher = None
+    if args.lexicon:
+        tool = marmat.MaRMAT(matcher_cache=marmat.MatcherCache(args.cache_dir) if args.cache_dir else None)
+        tool.fold_diacritics = args.fold_diacritics
+        marmat.load_lexicon_files(tool, args.lexicon)
+        if tool.lexicon_df is None:
+            sys.exit(1)
+        if args.categories:
+            categories = [cat.strip() for cat in args.categories.split(",")]
+        else:
+            categories = tool.lexicon_df['category'].dropna().unique().tolist()
+        page_matcher = PageMatcher(tool, [col.strip() for col in args.columns.split(",")], args.identifier,
+                                   categories, args.output, headings=args.headings)
+
+    harvester = OAIHarvester(args.url, args.output_dir, args.metadata_prefix, connections=args.connections,
+                             retries=args.retries, timeout=args.timeout)
+    try:
+        failures = asyncio.run(harvester.harvest(args.set, page_matcher))
+    finally:
+        if page_matcher is not None:
+            page_matcher.close()
+    print(f"Saved {harvester.pages} pages to {args.output_dir} ({harvester.requests} requests, "
+          f"{harvester.retried} retried).")
+    if page_matcher is not None:
+        print(f"{page_matcher.matches} matches in {page_matcher.records} records, saved to {args.output}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,327 @@
+"""Local HTTP/JSON matching service for MaRMAT.
+
+The lexicons are compiled once, kept in memory and recompiled in the background whenever one of
+the lexicon files changes, so records can be assessed as they are created instead of in nightly
+CSV batches. The service is built on the MaRMAT engine in MarMAT-CommandLine-2.6.py and returns
+the same match tuples.
+
+Usage:
+    python3 MaRMAT-Service.py --lexicon lexicon-reparative-metadata.csv --columns title,description,subjects
+
+Endpoints:
+    POST /match    {"record": {...}} or {"records": [{...}, ...]}, optionally with "columns",
+                   "identifier" and "categories" to override the service defaults for this request.
+                   Returns {"columns": [...], "matches": [[identifier, term, category, column, ...], ...]}.
+    POST /reload   Recompile the lexicons now.
+    GET  /health   Lexicon files, term count, load time and number of reloads.
+    GET  /metrics  Request latency histograms per endpoint.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+import marmat  # The matching engine in MarMAT-CommandLine-2.6.py
+
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+class LatencyHistogram:
+    """Cumulative histogram of request latencies, in milliseconds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last count is for slower requests
+        self.count = 0
+        self.total_ms = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Record one request that took `seconds`."""
+        ms = seconds * 1000
+        position = next((i for i, bound in enumerate(self.buckets) if ms <= bound), len(self.buckets))
+        with self.lock:
+            self.counts[position] += 1
+            self.count += 1
+            self.total_ms += ms
+
+    def snapshot(self):
+        """Return the histogram as a JSON-ready dictionary with cumulative bucket counts."""
+        with self.lock:
+            counts = list(self.counts)
+            count, total_ms = self.count, self.total_ms
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + ['+Inf'], counts):
+            running += bucket_count
+            cumulative.append([bound, running])
+        return {'count': count, 'sum_ms': round(total_ms, 3),
+                'mean_ms': round(total_ms / count, 3) if count else None, 'buckets': cumulative}
+
+
+class LexiconStore:
+    """The compiled lexicons, kept warm and recompiled when a lexicon file changes.
+
+    Every category is compiled into one matcher; requests for fewer categories filter its
+    matches, so no request ever waits for a compile.
+
+    """
+
+    def __init__(self, specs, headings=False, fold_diacritics=False, matcher_cache=None):
+        """Load and compile the lexicons.
+
+        Parameters:
+        specs (list of str): Lexicon paths, optionally as NAME=PATH (see `load_lexicon_files`).
+        headings (bool): Match as LCSH subject headings.
+        fold_diacritics (bool): Ignore accents when matching.
+        matcher_cache (MatcherCache): Optional on-disk cache for compiled lexicons.
+
+        """
+        self.specs = specs
+        self.headings = headings
+        self.fold_diacritics = fold_diacritics
+        self.matcher_cache = matcher_cache
+        self.lock = threading.Lock()  # Serializes reloads; matching reads `current` without locking
+        self.current = None  # (matcher, output columns, file signatures, load time)
+        self.reloads = 0
+        if not self.reload():
+            raise ValueError("The lexicons could not be loaded.")
+
+    def file_paths(self):
+        """Return the path of every lexicon file."""
+        return [spec.rpartition('=')[2] for spec in self.specs]
+
+    def signatures(self):
+        """Return the modification time and size of every lexicon file, to notice edits."""
+        signatures = []
+        for file_path in self.file_paths():
+            try:
+                stat = os.stat(file_path)
+                signatures.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signatures.append(None)
+        return signatures
+
+    def reload(self):
+        """Load and compile the lexicons, replacing the current matcher only if that succeeds.
+
+        Returns:
+        bool: Whether the new lexicons are in use.
+
+        """
+        with self.lock:
+            signatures = self.signatures()
+            tool = marmat.MaRMAT(matcher_cache=self.matcher_cache)
+            tool.fold_diacritics = self.fold_diacritics
+            marmat.load_lexicon_files(tool, self.specs)
+            if tool.lexicon_df is None:
+                return False
+            try:
+                categories = tool.lexicon_df['category'].dropna().unique().tolist()
+                matcher = tool.compile_matcher(categories, headings=self.headings)
+            except Exception as e:
+                print(f"An error occurred while compiling the lexicons: {e}")
+                return False
+            if self.current is not None:
+                self.reloads += 1
+            self.current = (matcher, tool.output_columns(self.headings), signatures, time.time())
+            print(f"Compiled {len(matcher.entries)} lexicon entries.")
+            return True
+
+    def reload_if_changed(self):
+        """Reload the lexicons if any lexicon file was modified since they were compiled."""
+        if self.signatures() != self.current[2]:
+            print("Lexicon file changed; reloading.")
+            self.reload()
+
+    def watch(self, interval):
+        """Check the lexicon files for changes every `interval` seconds, on a background thread."""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    print(f"An error occurred while reloading the lexicons: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def match_records(self, records, columns, identifier, categories=None):
+        """Match a batch of records.
+
+        Parameters:
+        records (list of dict): Records, each mapping column names to cell values.
+        columns (list of str): Columns to match; None matches every column except the identifier.
+        identifier (str): Identifier field; records without one, or with a null one, are identified
+            by their position in `records`.
+        categories (list of str): If given, only matches in these categories are returned.
+
+        Returns:
+        tuple: (output column names, list of match tuples).
+
+        """
+        matcher, output_columns, _, _ = self.current
+        metadata_df = pd.DataFrame.from_records(records)
+        # Taken from the records themselves, so a missing identifier does not turn the others into floats
+        identifiers = [record.get(identifier) for record in records]
+        metadata_df[identifier] = pd.Series([position if value is None else value
+                                             for position, value in enumerate(identifiers)], dtype=object)
+        if columns is None:
+            columns = [col for col in metadata_df.columns if col != identifier]
+        columns = [col for col in columns if col in metadata_df.columns]
+        matches = marmat.match_columns(matcher, metadata_df, columns, identifier)
+        if categories is not None:
+            categories = set(categories)
+            matches = [match for match in matches if match[2] in categories]
+        return output_columns, matches
+
+
+def is_string_list(value):
+    """Return True if a request field is a JSON list of strings."""
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+class MatchingHandler(BaseHTTPRequestHandler):
+    """Routes requests to the `LexiconStore` and records their latency."""
+
+    server_version = "MaRMAT"
+    protocol_version = "HTTP/1.1"  # Keep connections open between requests
+
+    def do_GET(self):
+        self.timed(self.handle_get)
+
+    def do_POST(self):
+        self.timed(self.handle_post)
+
+    def timed(self, handler):
+        start = time.perf_counter()
+        path = self.path.split('?', 1)[0]
+        try:
+            status, body = handler(path)
+        except (ValueError, TypeError) as e:
+            status, body = 400, {'error': str(e)}
+        except Exception as e:
+            status, body = 500, {'error': str(e)}
+        self.send_json(status, body)
+        histogram = self.server.histograms.get(path)
+        if histogram is not None:
+            histogram.observe(time.perf_counter() - start)
+
+    def handle_get(self, path):
+        store = self.server.store
+        if path == '/health':
+            matcher, output_columns, _, loaded = store.current
+            return 200, {'status': 'ok', 'lexicons': store.file_paths(), 'entries': len(matcher.entries),
+                         'columns': output_columns, 'loaded': time.strftime('%Y-%m-%dT%H:%M:%S',
+                                                                            time.localtime(loaded)),
+                         'reloads': store.reloads}
+        if path == '/metrics':
+            return 200, {name: histogram.snapshot() for name, histogram in self.server.histograms.items()}
+        return 404, {'error': f"Unknown endpoint {path}"}
+
+    def handle_post(self, path):
+        store = self.server.store
+        if path == '/reload':
+            return (200, {'reloaded': True}) if store.reload() else (500, {'error': "The lexicons could not be loaded."})
+        if path != '/match':
+            return 404, {'error': f"Unknown endpoint {path}"}
+        length = int(self.headers.get('Content-Length', 0))
+        if length < 0:
+            raise ValueError("Content-Length must not be negative.")
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f"Request body is larger than {MAX_BODY_BYTES} bytes.")
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if 'record' in request:
+            records = [request['record']]
+        elif 'records' in request:
+            records = request['records']
+        else:
+            raise ValueError('Send {"record": {...}} or {"records": [...]}.')
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ValueError("Records must be JSON objects.")
+        columns = request.get('columns', self.server.columns)
+        if columns is not None and not is_string_list(columns):
+            raise ValueError('"columns" must be a list of column names.')
+        categories = request.get('categories')
+        if categories is not None and not is_string_list(categories):
+            raise ValueError('"categories" must be a list of category names.')
+        output_columns, matches = store.match_records(records, columns,
+                                                      request.get('identifier', self.server.identifier), categories)
+        return 200, {'columns': output_columns, 'matches': [list(match) for match in matches]}
+
+    def send_json(self, status, body):
+        data = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(store, host='127.0.0.1', port=8765, columns=None, identifier='id', verbose=False):
+    """Create (but do not start) the HTTP server.
+
+    Parameters:
+    store (LexiconStore): The compiled lexicons.
+    host (str): Address to listen on; the default only accepts connections from this machine.
+    port (int): Port to listen on; 0 picks a free port.
+    columns (list of str): Default columns to match; None matches every field of a record.
+    identifier (str): Default identifier field.
+    verbose (bool): Log every request.
+
+    Returns:
+    ThreadingHTTPServer: The server; call `serve_forever()` to run it.
+
+    """
+    server = ThreadingHTTPServer((host, port), MatchingHandler)
+    server.daemon_threads = True
+    server.store = store
+    server.columns = columns
+    server.identifier = identifier
+    server.verbose = verbose
+    server.histograms = {path: LatencyHistogram() for path in ('/match', '/reload', '/health', '/metrics')}
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve MaRMAT matching over local HTTP/JSON.")
+    parser.add_argument("--lexicon", action="append", required=True,
+                        help="Lexicon CSV file; repeat it, optionally as NAME=PATH, to serve several lexicons.")
+    parser.add_argument("--columns", default=None,
+                        help="Comma-separated record fields to match by default (default: every field).")
+    parser.add_argument("--identifier", default="id",
+                        help="Record field used as the identifier by default (default: id).")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765).")
+    parser.add_argument("--headings", action="store_true",
+                        help="Match as LCSH subject headings (exact and broad matches).")
+    parser.add_argument("--fold-diacritics", action="store_true", help="Ignore accents when matching.")
+    parser.add_argument("--cache-dir", default=None, help="Directory in which to cache compiled lexicons.")
+    parser.add_argument("--reload-interval", type=float, default=2.0,
+                        help="Seconds between checks for edited lexicon files (default: 2).")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    matcher_cache = marmat.MatcherCache(args.cache_dir) if args.cache_dir else None
+    store = LexiconStore(args.lexicon, headings=args.headings, fold_diacritics=args.fold_diacritics,
+                         matcher_cache=matcher_cache)
+    store.watch(args.reload_interval)
+    columns = [col.strip() for col in args.columns.split(",")] if args.columns else None
+    server = make_server(store, args.host, args.port, columns, args.identifier, args.verbose)
+    print(f"MaRMAT service listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
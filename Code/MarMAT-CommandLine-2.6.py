@@ -1,17 +1,1656 @@
 import pandas as pd
+import argparse
+import bisect
+import codecs
+import collections
+import contextlib
+import glob
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import math
+import numpy as np
+import os
+import pickle
 import re
+import sys
+import time
+import tracemalloc
+import unicodedata
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pyarrow  # noqa: F401 -- enables pandas' multithreaded "pyarrow" CSV engine
+    import pyarrow.ipc
+    import pyarrow.parquet
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    pyarrow = None
+    CSV_ENGINE = 'c'
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+WORD_PATTERN = re.compile(r'\w+')
+# Subdivisions are separated by "--"; a trailing hyphen (open dates such as "1991-") stays with its part
+HEADING_SEPARATOR = re.compile(r'\s*--(?!-)\s*')
+MATCH_COLUMNS = ['Identifier', 'Term', 'Category', 'Column']
+ENCODING_SAMPLE_BYTES = 1 << 20  # Bytes read from the start of a file to guess its encoding
+BATCH_CHUNK_SIZE = 100000  # Rows read at a time from each file in batch mode
+SINK_BATCH_SIZE = 10000  # Matches handed to a sink at a time by `write_matches`
+MATCH_BLOCK_ROWS = 5000  # Rows of loaded metadata scanned by `iter_matches` between yields
+OAI_NAMESPACE = '{http://www.openarchives.org/OAI/2.0/}'
+DC_NAMESPACES = ('{http://purl.org/dc/elements/1.1/}', '{http://purl.org/dc/terms/}')
+XML_FIELD_SEPARATOR = '; '  # Joins repeated fields of an XML record, like the semicolons in CSV exports
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+
+
+def sniff_encoding(data):
+    """Guess the encoding of CSV bytes: UTF-8 (with or without a byte order mark) or UTF-16 when
+    the bytes say so, otherwise Latin-1, which can decode anything.
+
+    Parameters:
+    data (bytes): The file contents, or the first part of them.
+
+    Returns:
+    str: Encoding name for `pd.read_csv`.
+
+    """
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        # Incremental, so a character cut off at the end of a sample does not count against UTF-8
+        codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin1'
+
+
+def compression_of(file_path):
+    """Return 'gzip' or 'zstd' for a ".gz" or ".zst" file, or None for an uncompressed one."""
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(file_path)[1].lower())
+
+
+def strip_compression_suffix(file_path):
+    """Drop a ".gz" or ".zst" suffix, e.g. "records.tsv.gz" -> "records.tsv"."""
+    return os.path.splitext(file_path)[0] if compression_of(file_path) else file_path
+
+
+def open_decompressed(file_path):
+    """Open a file for reading bytes, decompressing ".gz" and ".zst" files on the fly."""
+    compression = compression_of(file_path)
+    if compression == 'gzip':
+        return gzip.open(file_path, 'rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("Reading .zst files needs the zstandard package: pip install zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+    return open(file_path, 'rb')
+
+
+def detect_encoding(file_path):
+    """Guess the encoding of a text file from its first `ENCODING_SAMPLE_BYTES` bytes (see `sniff_encoding`).
+
+    Compressed files are sniffed after decompression.
+
+    """
+    with open_decompressed(file_path) as text_file:
+        return sniff_encoding(text_file.read(ENCODING_SAMPLE_BYTES))
+
+
+def decodes_as(file_path, encoding):
+    """Return True if a whole file is valid text in `encoding`, checking it block by block.
+
+    Parameters:
+    file_path (str): Path to the file; ".gz" and ".zst" files are checked after decompression.
+    encoding (str): Encoding name, e.g. from `detect_encoding`.
+
+    Returns:
+    bool: Whether every byte of the file decodes.
+
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    try:
+        with open_decompressed(file_path) as text_file:
+            for block in iter(lambda: text_file.read(ENCODING_SAMPLE_BYTES), b''):
+                decoder.decode(block)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def read_csv_file(file_path, encoding, usecols=None, sep=','):
+    """Read a whole CSV file, with the multithreaded pyarrow engine when it is installed.
+
+    Parameters:
+    file_path (str): Path to the CSV file; ".gz" and ".zst" files are decompressed.
+    encoding (str): Encoding from `detect_encoding`; if the file turns out not to be valid in it
+        beyond the sampled part, it is read again as Latin-1.
+    usecols (list of str): If given, only these columns are parsed.
+    sep (str): Field delimiter, e.g. '\\t' for TSV files.
+
+    Returns:
+    DataFrame: The file contents.
+
+    """
+    try:
+        metadata_df = pd.read_csv(file_path, sep=sep, encoding=encoding, usecols=usecols, engine=CSV_ENGINE)
+        if encoding == 'latin1' or not has_undecoded_columns(metadata_df):
+            return metadata_df
+    except UnicodeDecodeError:
+        if encoding == 'latin1':
+            raise
+    print(f"{file_path} is not entirely {encoding}; reading it as Latin-1 instead.")
+    return pd.read_csv(file_path, sep=sep, encoding='latin1', usecols=usecols, engine=CSV_ENGINE)
+
+
+def has_undecoded_columns(metadata_df):
+    """Return True if any column holds raw bytes rather than text.
+
+    The pyarrow engine does not raise UnicodeDecodeError for text that is invalid in the given
+    encoding; it returns the whole column as bytes instead.
+
+    """
+    for position in np.flatnonzero((metadata_df.dtypes == object).to_numpy()):
+        values = metadata_df.iloc[:, position].dropna()
+        if len(values) and isinstance(values.iat[0], bytes):
+            return True
+    return False
+
+
+def iter_oai_records(source):
+    """Stream the records of an OAI-PMH XML file (such as a ListRecords response) one at a time.
+
+    The file is parsed incrementally; each record's fields are collected in a single pass over its
+    elements, and the record is dropped from the tree as soon as it ends, so memory use does not
+    grow with the file. Deleted records are skipped.
+
+    Parameters:
+    source (str or file object): OAI-PMH XML file, e.g. one in the Qualified Dublin Core layout
+        of "XML Test Code/Sample Data/oai_uum_map.xml".
+
+    Yields:
+    dict: The header's 'oai_identifier', 'datestamp' and 'setSpec', plus every dc: and dcterms:
+        field under its local name ('title', 'subject', 'spatial', ...). Repeated fields are
+        joined with `XML_FIELD_SEPARATOR`.
+
+    """
+    record_tag = OAI_NAMESPACE + 'record'
+    header_fields = {OAI_NAMESPACE + 'identifier': 'oai_identifier', OAI_NAMESPACE + 'datestamp': 'datestamp',
+                     OAI_NAMESPACE + 'setSpec': 'setSpec'}
+    open_elements = []
+    fields = {}
+    deleted = False
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            open_elements.append(element)
+            if element.tag == OAI_NAMESPACE + 'header' and element.get('status') == 'deleted':
+                deleted = True
+            continue
+        open_elements.pop()
+        tag = element.tag
+        if tag == record_tag:
+            if not deleted:
+                yield fields
+            fields = {}
+            deleted = False
+            if open_elements:
+                open_elements[-1].remove(element)  # Forget the finished record
+            continue
+        if tag.startswith(DC_NAMESPACES):
+            name = tag.rpartition('}')[2]
+        elif tag in header_fields:
+            name = header_fields[tag]
+        else:
+            continue
+        text = (element.text or '').strip()
+        if text:
+            fields[name] = fields[name] + XML_FIELD_SEPARATOR + text if name in fields else text
+
+
+def record_chunks(records, columns=None, chunk_size=BATCH_CHUNK_SIZE):
+    """Group a stream of record dictionaries into DataFrames of at most `chunk_size` rows.
+
+    Parameters:
+    records (iterable of dict): Records, e.g. from `iter_oai_records`.
+    columns (list of str): Columns to keep; fields a record lacks are left empty. Defaults to
+        every field found in the chunk.
+    chunk_size (int): Number of records per DataFrame.
+
+    Yields:
+    DataFrame: One chunk of records.
+
+    """
+    records = iter(records)
+    chunk = list(itertools.islice(records, chunk_size))
+    while chunk:
+        yield pd.DataFrame.from_records(chunk, columns=columns)
+        chunk = list(itertools.islice(records, chunk_size))
+
+
+class MetadataReader:
+    """Reads the columns of one metadata file, whole or a chunk at a time.
+
+    Subclasses handle one format each and are looked up by file extension in `METADATA_READERS`,
+    so a new format only needs a subclass and an entry there. Compressed files (".gz", ".zst")
+    are decompressed on the fly and looked up by the extension before the compression suffix.
+
+    """
+
+    def __init__(self, file_path, encoding=None):
+        """Open a metadata file.
+
+        Parameters:
+        file_path (str): Path to the metadata file.
+        encoding (str): Encoding of a text file; detected if not given.
+
+        """
+        self.file_path = file_path
+        self.compression = compression_of(file_path)
+        self.encoding = encoding
+
+    def columns(self):
+        """Return the column names, reading as little of the file as possible.
+
+        Returns:
+        list of str: The columns, or an empty list if they are only known once the file is read.
+
+        """
+        raise NotImplementedError
+
+    def read(self, usecols=None):
+        """Read the whole file, or just the `usecols` columns, into a DataFrame."""
+        raise NotImplementedError
+
+    def chunks(self, usecols, chunk_size):
+        """Yield the `usecols` columns of the file as DataFrames of at most `chunk_size` rows."""
+        raise NotImplementedError
+
+
+class DelimitedReader(MetadataReader):
+    """Reads comma-separated files."""
+
+    sep = ','
+
+    def __init__(self, file_path, encoding=None):
+        super().__init__(file_path, encoding)
+        if self.encoding is None:
+            self.encoding = detect_encoding(file_path)
+
+    def columns(self):
+        return pd.read_csv(self.file_path, sep=self.sep, encoding=self.encoding, nrows=0).columns.tolist()
+
+    def read(self, usecols=None):
+        return read_csv_file(self.file_path, self.encoding, usecols=usecols, sep=self.sep)
+
+    def chunks(self, usecols, chunk_size):
+        # The encoding was guessed from the start of the file, and a chunked read cannot switch to
+        # Latin-1 part way through like `read_csv_file` does, so check the rest of the file first
+        if self.encoding != 'latin1' and not decodes_as(self.file_path, self.encoding):
+            print(f"{self.file_path} is not entirely {self.encoding}; reading it as Latin-1 instead.")
+            self.encoding = 'latin1'
+        yield from pd.read_csv(self.file_path, sep=self.sep, encoding=self.encoding, usecols=usecols,
+                               chunksize=chunk_size)
+
+
+class TSVReader(DelimitedReader):
+    """Reads tab-separated files, such as OpenRefine's TSV exports."""
+
+    sep = '\t'
+
+
+class JSONLinesReader(MetadataReader):
+    """Reads JSON Lines files, one JSON object per record.
+
+    Values keep their JSON types; fields missing from a record are left empty.
+
+    """
+
+    def __init__(self, file_path, encoding=None):
+        super().__init__(file_path, encoding)
+        if self.encoding is None:
+            self.encoding = detect_encoding(file_path)
+
+    def columns(self):
+        # The fields of the first record; later records may add more
+        with open_decompressed(self.file_path) as json_file:
+            for line in json_file:
+                if line.strip():
+                    return list(json.loads(line.decode(self.encoding)))
+        return []
+
+    def reader(self, chunk_size):
+        return pd.read_json(self.file_path, lines=True, chunksize=chunk_size, encoding=self.encoding,
+                            dtype=False, convert_dates=False)
+
+    def read(self, usecols=None):
+        with self.reader(BATCH_CHUNK_SIZE) as reader:
+            chunks = [chunk if usecols is None else chunk.reindex(columns=usecols) for chunk in reader]
+        if not chunks:
+            return pd.DataFrame(columns=usecols)
+        return pd.concat(chunks, ignore_index=True)
+
+    def chunks(self, usecols, chunk_size):
+        with self.reader(chunk_size) as reader:
+            for chunk in reader:
+                yield chunk.reindex(columns=usecols)
+
+
+class ParquetReader(MetadataReader):
+    """Reads Parquet files one row group at a time (needs pyarrow)."""
+
+    def __init__(self, file_path, encoding=None):
+        super().__init__(file_path, encoding)
+        if pyarrow is None:
+            raise ImportError("Reading Parquet files needs the pyarrow package: pip install pyarrow")
+        if self.compression:
+            raise ValueError(f"{file_path}: Parquet files are compressed internally; decompress it first.")
+
+    def columns(self):
+        return pyarrow.parquet.ParquetFile(self.file_path).schema_arrow.names
+
+    def read(self, usecols=None):
+        return pyarrow.parquet.read_table(self.file_path, columns=usecols).to_pandas()
+
+    def chunks(self, usecols, chunk_size):
+        # iter_batches decodes one row group at a time, so memory use follows the chunk size
+        parquet_file = pyarrow.parquet.ParquetFile(self.file_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=usecols):
+            yield batch.to_pandas()
+
+
+class XMLReader(MetadataReader):
+    """Reads OAI-PMH XML files record by record (see `iter_oai_records`)."""
+
+    def columns(self):
+        return []  # Fields are only known once the records are read
+
+    def read(self, usecols=None):
+        with open_decompressed(self.file_path) as xml_file:
+            return pd.DataFrame.from_records(iter_oai_records(xml_file), columns=usecols)
+
+    def chunks(self, usecols, chunk_size):
+        with open_decompressed(self.file_path) as xml_file:
+            yield from record_chunks(iter_oai_records(xml_file), usecols, chunk_size)
+
+
+METADATA_READERS = {
+    '.csv': DelimitedReader,
+    '.tsv': TSVReader,
+    '.tab': TSVReader,
+    '.jsonl': JSONLinesReader,
+    '.ndjson': JSONLinesReader,
+    '.parquet': ParquetReader,
+    '.xml': XMLReader,
+}
+
+
+def metadata_reader(file_path, encoding=None):
+    """Open a metadata file with the reader registered for its extension; unknown extensions are read as CSV.
+
+    Parameters:
+    file_path (str): Path to the metadata file, e.g. "records.tsv" or "records.jsonl.gz".
+    encoding (str): Encoding of a text file; detected if not given.
+
+    Returns:
+    MetadataReader: The reader.
+
+    """
+    extension = os.path.splitext(strip_compression_suffix(file_path))[1].lower()
+    reader_class = METADATA_READERS.get(extension, DelimitedReader)
+    return reader_class(file_path, encoding)
+
+
+def read_metadata_chunks(file_path, needed_columns, chunk_size, encoding=None):
+    """Read the needed columns of a metadata file in any supported format `chunk_size` rows at a time.
+
+    Parameters:
+    file_path (str): Path to the metadata file.
+    needed_columns (list of str): Columns to read.
+    chunk_size (int): Number of rows per chunk.
+    encoding (str): Encoding of a text file; detected if not given.
+
+    Yields:
+    DataFrame: One chunk of rows.
+
+    """
+    yield from metadata_reader(file_path, encoding).chunks(needed_columns, chunk_size)
+
+
+def is_word_char(ch):
+    """Return True if `ch` counts as a word character for the regex `\\b` anchor."""
+    return ch.isalnum() or ch == '_'
+
+
+class TextNormalizer:
+    """Normalizes text before matching: Unicode NFKC, casefolding and optionally diacritic folding.
+
+    Lexicon terms and metadata cells go through the same normalizer, so "ﬁre", "ＦＩＲＥ" and "Fire"
+    all match the term "fire", and with `fold_diacritics` "Métis" also matches "metis". ASCII text,
+    by far the most common, is simply lowercased.
+
+    """
+
+    def __init__(self, fold_diacritics=False):
+        """Set up the normalizer.
+
+        Parameters:
+        fold_diacritics (bool): Also strip accents and other combining marks.
+
+        """
+        self.fold_diacritics = fold_diacritics
+
+    def normalize(self, text):
+        """Return the normalized form of a string.
+
+        Parameters:
+        text (str): Original text.
+
+        Returns:
+        str: Normalized text.
+
+        """
+        if text.isascii():
+            return text.lower()
+        # Casefolding can undo NFKC (e.g. for some Greek and Cherokee letters), so normalize again
+        text = unicodedata.normalize('NFKC', unicodedata.normalize('NFKC', text).casefold())
+        if self.fold_diacritics:
+            text = unicodedata.normalize('NFKC', ''.join(
+                ch for ch in unicodedata.normalize('NFKD', text) if not unicodedata.combining(ch)))
+        return text
+
+    def normalize_values(self, values):
+        """Normalize a column of distinct values.
+
+        Parameters:
+        values (array-like): Cell values; anything that is not a string becomes NaN.
+
+        Returns:
+        Series of str: Normalized texts.
+
+        """
+        return pd.Series([self.normalize(value) if isinstance(value, str) else np.nan for value in values],
+                         dtype=object)
+
+    def normalize_with_offsets(self, text):
+        """Normalize a string and map each normalized character back to the original text.
+
+        Parameters:
+        text (str): Original text.
+
+        Returns:
+        tuple: (normalized text, offsets), where offsets[i] is the position in `text` of the
+            character that normalized[i] came from, and offsets[-1] is len(text).
+
+        """
+        if text.isascii():
+            return text.lower(), list(range(len(text) + 1))
+        # Normalize each base character together with the combining marks that follow it
+        pieces, offsets = [], []
+        start = 0
+        for position in range(1, len(text) + 1):
+            if position == len(text) or not unicodedata.combining(text[position]):
+                piece = self.normalize(text[start:position])
+                pieces.append(piece)
+                offsets.extend([start] * len(piece))
+                start = position
+        normalized = ''.join(pieces)
+        if normalized != self.normalize(text):
+            # Characters composed across pieces (e.g. Hangul jamo); spread the offsets evenly instead
+            normalized = self.normalize(text)
+            offsets = [i * len(text) // len(normalized) for i in range(len(normalized))]
+        offsets.append(len(text))
+        return normalized, offsets
+
+    @staticmethod
+    def original_span(offsets, start, end):
+        """Map a span of normalized text back to the original text.
+
+        Parameters:
+        offsets (list of int): Offsets from `normalize_with_offsets`.
+        start (int): Start of the span in the normalized text.
+        end (int): End of the span in the normalized text (exclusive).
+
+        Returns:
+        tuple: (start, end) in the original text, widened to whole original characters.
+
+        """
+        if end <= start:
+            return offsets[start], offsets[start]
+        return offsets[start], offsets[bisect.bisect_right(offsets, offsets[end - 1])]
+
+
+class LexiconMatcher:
+    """Aho-Corasick automaton compiled once from the terms of a lexicon.
+
+    A cell is scanned in a single pass and a term counts as matched when at least one
+    of its occurrences satisfies the same word-boundary rule as
+    `re.search(r'\\b' + re.escape(term.lower()) + r'\\b', text.lower())`, with terms and
+    text normalized by a `TextNormalizer` rather than just lowercased.
+
+    """
+
+    extra_columns = []  # Output columns added after (Identifier, Term, Category, Column)
+
+    def __init__(self, terms, categories, normalizer=None, sources=None):
+        """Compile the automaton.
+
+        Parameters:
+        terms (iterable of str): Lexicon terms, in lexicon order.
+        categories (iterable of str): Category of each term.
+        normalizer (TextNormalizer): Normalization applied to terms and text; defaults to
+            `TextNormalizer()`.
+        sources (iterable of str): If given, the lexicon each term comes from, added to its
+            entry and reported in a "Lexicon" column.
+
+        """
+        self.normalizer = normalizer if normalizer is not None else TextNormalizer()
+        self.sourced = sources is not None
+        if self.sourced:
+            self.entries = list(zip(terms, categories, sources))
+            self.extra_columns = self.extra_columns + ['Lexicon']
+        else:
+            self.entries = list(zip(terms, categories))
+
+        # Terms sharing the same normalized form are scanned as one pattern
+        patterns = {}
+        for index, entry in enumerate(self.entries):
+            patterns.setdefault(self.normalizer.normalize(entry[0]), []).append(index)
+        self.patterns = [pattern for pattern in patterns if pattern]
+        self.pattern_entries = [patterns[pattern] for pattern in self.patterns]
+        self.pattern_ids = {pattern: pattern_id for pattern_id, pattern in enumerate(self.patterns)}
+        self.pattern_bounds = [(is_word_char(pattern[0]), is_word_char(pattern[-1])) for pattern in self.patterns]
+
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                next_state = self.goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][ch] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = next_state
+            self.output[state] += (pattern_id,)
+
+        # Patterns that open with a word character can only match where a whole word of the
+        # cell equals their leading word, which lets columnar scans look candidates up by word
+        self.word_index = {}
+        self.unanchored = []
+        for pattern_id, pattern in enumerate(self.patterns):
+            if self.pattern_bounds[pattern_id][0]:
+                self.word_index.setdefault(WORD_PATTERN.match(pattern).group(), []).append(pattern_id)
+            else:
+                self.unanchored.append(pattern_id)
+
+        # Breadth-first pass to fill in failure links and merge outputs along them
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                if state:
+                    self.fail[next_state] = self.goto[fallback].get(ch, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def find(self, text):
+        """Scan normalized text and return the indices of the lexicon entries it matches.
+
+        Parameters:
+        text (str): Normalized cell text.
+
+        Returns:
+        list of int: Sorted indices into `entries`.
+
+        """
+        goto, fail, output = self.goto, self.fail, self.output
+        patterns, bounds = self.patterns, self.pattern_bounds
+        length = len(text)
+        found = set()
+        state = 0
+        for end, ch in enumerate(text, 1):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern_id in output[state]:
+                if pattern_id in found:
+                    continue
+                start = end - len(patterns[pattern_id])
+                starts_word, ends_word = bounds[pattern_id]
+                # \b holds where the characters on either side differ in "wordness"
+                if (start > 0 and is_word_char(text[start - 1])) == starts_word:
+                    continue
+                if (end < length and is_word_char(text[end])) == ends_word:
+                    continue
+                found.add(pattern_id)
+        return sorted(index for pattern_id in found for index in self.pattern_entries[pattern_id])
+
+    def find_in_words(self, text, words):
+        """Return the indices of the lexicon entries matched in normalized text, given its words.
+
+        Only patterns whose leading word occurs in `words` are checked, which avoids the
+        character-by-character scan when the lexicon has no unanchored patterns.
+
+        Parameters:
+        text (str): Normalized cell text.
+        words (list of str): The `\\w+` runs of `text`.
+
+        Returns:
+        list of int: Sorted indices into `entries`.
+
+        """
+        if self.unanchored:
+            return self.find(text)
+        found = set()
+        for word in self.word_index.keys() & words:
+            for pattern_id in self.word_index[word]:
+                if self.occurs(text, pattern_id):
+                    found.add(pattern_id)
+        return sorted(index for pattern_id in found for index in self.pattern_entries[pattern_id])
+
+    def occurs(self, text, pattern_id):
+        """Return True if a pattern occurs in normalized text between word boundaries.
+
+        Parameters:
+        text (str): Normalized cell text.
+        pattern_id (int): Index into `patterns`.
+
+        Returns:
+        bool: Whether any occurrence satisfies the word-boundary rule.
+
+        """
+        return self.locate(text, pattern_id) is not None
+
+    def locate(self, text, pattern_id):
+        """Find the first occurrence of a pattern in normalized text between word boundaries.
+
+        Parameters:
+        text (str): Normalized cell text.
+        pattern_id (int): Index into `patterns`.
+
+        Returns:
+        tuple: (start, end) of the occurrence in `text`, or None if there is none.
+
+        """
+        pattern = self.patterns[pattern_id]
+        starts_word, ends_word = self.pattern_bounds[pattern_id]
+        length = len(text)
+        start = text.find(pattern)
+        while start != -1:
+            end = start + len(pattern)
+            if ((start > 0 and is_word_char(text[start - 1])) != starts_word
+                    and (end < length and is_word_char(text[end])) != ends_word):
+                return start, end
+            start = text.find(pattern, start + 1)
+        return None
+
+    def spans(self, text, terms):
+        """Locate matched terms in the original text of a cell.
+
+        Parameters:
+        text (str): Original cell text.
+        terms (iterable of str): Lexicon terms matched in the cell.
+
+        Returns:
+        list of tuple: For each term, the (start, end) in `text` of its first occurrence between
+            word boundaries, or None if it does not occur.
+
+        """
+        normalized, offsets = self.normalizer.normalize_with_offsets(text)
+        spans = []
+        for term in terms:
+            pattern_id = self.pattern_ids.get(self.normalizer.normalize(term))
+            span = None if pattern_id is None else self.locate(normalized, pattern_id)
+            spans.append(None if span is None else self.normalizer.original_span(offsets, *span))
+        return spans
+
+    def scan_texts(self, texts):
+        """Match a column of distinct normalized values.
+
+        Parameters:
+        texts (Series of str): Normalized cell texts.
+
+        Returns:
+        list of list of int: Sorted indices into `entries` for each text.
+
+        """
+        words = texts.str.findall(WORD_PATTERN).tolist()
+        return [self.find_in_words(text, text_words) for text, text_words in zip(texts.tolist(), words)]
+
+    def match(self, text):
+        """Return the (term, category) entries matched in a cell, in lexicon order.
+
+        Parameters:
+        text (str): Original cell text.
+
+        Returns:
+        list of tuple: Matched (term, category) entries, plus the lexicon source if the matcher has sources.
+
+        """
+        return [self.entries[index] for index in self.find(self.normalizer.normalize(text))]
+
+
+def normalize_heading(heading, normalizer):
+    """Normalize a subject heading and tidy the spacing around its "--" subdivisions."""
+    return '--'.join(HEADING_SEPARATOR.split(normalizer.normalize(heading.strip())))
+
+
+class HeadingIndex:
+    """Hash index of LCSH lexicon headings for subject columns.
+
+    Cells are split into semicolon-delimited headings, and each heading into its "--"
+    subdivisions. A term matches exactly when it equals a heading or one of its leading
+    subdivision strings (so "Indians of North America" matches
+    "Indians of North America--Monuments--Photographs"). A term with subdivisions also
+    matches broadly when only its main heading appears as the main heading of a cell heading.
+
+    """
+
+    extra_columns = ['Match Type']
+
+    def __init__(self, terms, categories, broad=True, normalizer=None, sources=None):
+        """Build the index.
+
+        Parameters:
+        terms (iterable of str): Lexicon headings, in lexicon order.
+        categories (iterable of str): Category of each heading.
+        broad (bool): Also report main-heading-only matches.
+        normalizer (TextNormalizer): Normalization applied to headings and text; defaults to
+            `TextNormalizer()`.
+        sources (iterable of str): If given, the lexicon each heading comes from, added to its
+            entries and reported in a "Lexicon" column.
+
+        """
+        self.normalizer = normalizer if normalizer is not None else TextNormalizer()
+        self.sourced = sources is not None
+        if self.sourced:
+            self.extra_columns = self.extra_columns + ['Lexicon']
+        else:
+            sources = itertools.repeat(None)
+        # Each term gets an exact entry at 2 * i and a broad entry at 2 * i + 1,
+        # so sorting entry indices keeps lexicon order
+        self.entries = []
+        self.exact = {}  # Normalized heading -> exact entry indices
+        self.main = {}  # Main heading -> broad entry indices
+        for term, category, source in zip(terms, categories, sources):
+            heading = normalize_heading(term, self.normalizer)
+            source = (source,) if self.sourced else ()
+            self.exact.setdefault(heading, []).append(len(self.entries))
+            self.entries.append((term, category, 'Exact') + source)
+            if broad and '--' in heading:
+                self.main.setdefault(heading.split('--', 1)[0], []).append(len(self.entries))
+            self.entries.append((term, category, 'Broad') + source)
+
+    def find(self, text):
+        """Look up the headings of a normalized cell and return the indices of the entries it matches.
+
+        Parameters:
+        text (str): Normalized cell text.
+
+        Returns:
+        list of int: Sorted indices into `entries`, with at most one entry per term.
+
+        """
+        found = set()
+        for heading in text.split(';'):
+            parts = HEADING_SEPARATOR.split(heading.strip())
+            found.update(self.main.get(parts[0], ()))
+            prefix = parts[0]
+            found.update(self.exact.get(prefix, ()))
+            for part in parts[1:]:
+                prefix += '--' + part
+                found.update(self.exact.get(prefix, ()))
+        # An exact match makes the broad match of the same term redundant
+        return sorted(index for index in found if index % 2 == 0 or index - 1 not in found)
+
+    def scan_texts(self, texts):
+        """Match a column of distinct normalized values.
+
+        Parameters:
+        texts (Series of str): Normalized cell texts.
+
+        Returns:
+        list of list of int: Sorted indices into `entries` for each text.
+
+        """
+        return [self.find(text) for text in texts.tolist()]
+
+    def match(self, text):
+        """Return the (term, category, match type) entries matched in a cell, in lexicon order.
+
+        Entries end with the lexicon source if the index has sources.
+
+        Parameters:
+        text (str): Original cell text.
+
+        Returns:
+        list of tuple: Matched (term, category, match type) entries.
+
+        """
+        return [self.entries[index] for index in self.find(self.normalizer.normalize(text))]
+
+
+def normalize_column(column, normalizer):
+    """Factorize a column and normalize each of its distinct values.
+
+    Parameters:
+    column (Series): Metadata column.
+    normalizer (TextNormalizer): Normalization to apply.
+
+    Returns:
+    tuple: (codes, normalized) where codes gives each row's position in `normalized` (-1 for
+        missing cells) and normalized holds the distinct values, NaN where they are not text;
+        None if the column cannot hold text.
+
+    """
+    # Numeric columns cannot hold text
+    if not (pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column)):
+        return None
+    codes, uniques = pd.factorize(column)
+    return codes, normalizer.normalize_values(uniques)
+
+
+def slice_normalized(normalized, start, stop):
+    """Cut the output of `normalize_column` down to a block of rows.
+
+    Parameters:
+    normalized (tuple): (codes, normalized) from `normalize_column`, or None.
+    start (int): First row position of the block.
+    stop (int): Row position just past the block.
+
+    Returns:
+    tuple: (codes, normalized) holding only the distinct values used in the block, or None.
+
+    """
+    if normalized is None:
+        return None
+    codes, uniques = normalized
+    block_codes = codes[start:stop]
+    present = block_codes >= 0
+    used = np.unique(block_codes[present])
+    sliced_codes = np.full(len(block_codes), -1, dtype=block_codes.dtype)
+    sliced_codes[present] = np.searchsorted(used, block_codes[present])
+    return sliced_codes, uniques.iloc[used].reset_index(drop=True)
+
+
+def find_hits(matcher, metadata_df, selected_columns, scan_stats=None, profiler=None, normalized_columns=None):
+    """Scan the selected columns one at a time and return the matched cells in row-major order.
+
+    Each distinct value of a column is matched once and its hits are fanned out to every
+    row that shares it.
+
+    Parameters:
+    matcher (LexiconMatcher or HeadingIndex): Compiled lexicon to match against.
+    metadata_df (DataFrame): Metadata rows to scan.
+    selected_columns (list of str): List of column names from metadata for matching.
+    scan_stats (Counter): If given, 'cells' is increased by the number of text cells and
+        'scans' by the number of distinct values actually scanned.
+    profiler (Profiler): If given, records per-column scan times and per-term verification costs.
+    normalized_columns (dict): Output of `normalize_column` by column name, prepared with the
+        matcher's normalizer; columns missing from it are normalized here.
+
+    Returns:
+    list of tuple: (row position, column position, matched entry indices) for each matched cell.
+
+    """
+    hits = []  # (row position, column position, matched entry indices)
+    for col_position, col in enumerate(selected_columns):
+        if normalized_columns is not None and col in normalized_columns:
+            normalized = normalized_columns[col]
+        else:
+            normalized = normalize_column(metadata_df[col], matcher.normalizer)
+        if normalized is None:
+            continue
+        codes, uniques = normalized
+        is_text = uniques.notna().to_numpy()
+        texts = uniques[is_text]
+        if profiler is None:
+            results = matcher.scan_texts(texts)
+        else:
+            start = time.perf_counter()
+            results = profiler.scan_texts(matcher, texts)
+            profiler.add_column(col, time.perf_counter() - start, int(np.count_nonzero(is_text[codes[codes >= 0]])),
+                                len(texts))
+        unique_entries = [None] * len(uniques)
+        for unique_position, entries in zip(is_text.nonzero()[0].tolist(), results):
+            unique_entries[unique_position] = entries
+
+        if scan_stats is not None:
+            scan_stats['cells'] += int(np.count_nonzero(is_text[codes[codes >= 0]]))
+            scan_stats['scans'] += len(texts)
+        # Code -1 indexes the trailing False, so missing cells drop out
+        has_hits = np.array([bool(entries) for entries in unique_entries] + [False])
+        for row_position in np.flatnonzero(has_hits[codes]).tolist():
+            hits.append((row_position, col_position, unique_entries[codes[row_position]]))
+
+    # Restore row-major order so the output matches the iterrows loop
+    hits.sort(key=lambda hit: (hit[0], hit[1]))
+    return hits
+
+
+def match_columns(matcher, metadata_df, selected_columns, identifier_column, scan_stats=None, profiler=None,
+                  normalized_columns=None):
+    """Find matches one column at a time, returning them in the same order as a row-by-row scan.
+
+    Parameters:
+    matcher (LexiconMatcher or HeadingIndex): Compiled lexicon to match against.
+    metadata_df (DataFrame): Metadata rows to scan.
+    selected_columns (list of str): List of column names from metadata for matching.
+    identifier_column (str): Name of the identifier column in the metadata.
+    scan_stats (Counter): Passed on to `find_hits`.
+    profiler (Profiler): Passed on to `find_hits`.
+    normalized_columns (dict): Passed on to `find_hits`.
+
+    Returns:
+    list of tuple: List of tuples containing matched results (Identifier, Term, Category, Column),
+        followed by any of the matcher's `extra_columns`.
+
+    """
+    hits = find_hits(matcher, metadata_df, selected_columns, scan_stats, profiler, normalized_columns)
+    identifiers = metadata_df[identifier_column].tolist()
+    matches = []
+    for row_position, col_position, entries in hits:
+        identifier = identifiers[row_position]
+        col = selected_columns[col_position]
+        for index in entries:
+            entry = matcher.entries[index]
+            matches.append((identifier, entry[0], entry[1], col) + entry[2:])
+    return matches
+
+
+class MatchTable:
+    """Matches held as three parallel integer arrays instead of one tuple per match.
+
+    Each match is a row position in the metadata, an index into the matcher's entries (which
+    stands for the term, its category and any extra fields) and a position in the selected
+    columns. Identifiers, terms, categories and column names are looked up only when the table
+    is turned into a DataFrame (`to_frame`, with Categorical columns) or iterated, which yields
+    the same tuples as `match_columns`.
+
+    """
+
+    def __init__(self, entries, identifiers, column_names, rows=(), entry_ids=(), column_codes=()):
+        """Wrap match arrays.
+
+        Parameters:
+        entries (list of tuple): The matcher's entries, e.g. `LexiconMatcher.entries`.
+        identifiers (Series): Identifier of every metadata row, by row position.
+        column_names (list of str): The selected columns, by column position.
+        rows (array of int): Row position of each match.
+        entry_ids (array of int): Entry index of each match.
+        column_codes (array of int): Column position of each match.
+
+        """
+        self.entries = entries
+        self.identifiers = identifiers
+        self.column_names = list(column_names)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.entry_ids = np.asarray(entry_ids, dtype=np.int32)
+        self.column_codes = np.asarray(column_codes, dtype=np.int16)
+
+    @classmethod
+    def from_hits(cls, hits, entries, identifiers, column_names):
+        """Build a table from the output of `find_hits`, keeping its row-major order."""
+        counts = np.fromiter((len(hit[2]) for hit in hits), dtype=np.int64, count=len(hits))
+        rows = np.repeat(np.fromiter((hit[0] for hit in hits), dtype=np.int64, count=len(hits)), counts)
+        column_codes = np.repeat(np.fromiter((hit[1] for hit in hits), dtype=np.int16, count=len(hits)), counts)
+        entry_ids = np.fromiter(itertools.chain.from_iterable(hit[2] for hit in hits), dtype=np.int32,
+                                count=int(counts.sum()))
+        return cls(entries, identifiers, column_names, rows, entry_ids, column_codes)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        identifiers = self.identifiers.take(self.rows).tolist()
+        for identifier, entry_id, column_code in zip(identifiers, self.entry_ids.tolist(),
+                                                     self.column_codes.tolist()):
+            entry = self.entries[entry_id]
+            yield (identifier, entry[0], entry[1], self.column_names[column_code]) + entry[2:]
+
+    def __getitem__(self, position):
+        entry = self.entries[self.entry_ids[position]]
+        return ((self.identifiers.iloc[self.rows[position]], entry[0], entry[1],
+                 self.column_names[self.column_codes[position]]) + entry[2:])
+
+    def to_frame(self, output_columns=MATCH_COLUMNS):
+        """Resolve the matches into a DataFrame whose text columns are pandas Categoricals.
+
+        Parameters:
+        output_columns (list of str): Column names, e.g. from `MaRMAT.output_columns`.
+
+        Returns:
+        DataFrame: One row per match, in the same order as iterating the table.
+
+        """
+        fields = []
+        for position in range(len(self.entries[0]) if self.entries else len(output_columns) - 2):
+            codes, values = pd.factorize(np.array([entry[position] for entry in self.entries], dtype=object))
+            fields.append(pd.Categorical.from_codes(codes[self.entry_ids], categories=values))
+        column_codes, column_names = pd.factorize(np.array(self.column_names, dtype=object))
+        columns = pd.Categorical.from_codes(column_codes[self.column_codes], categories=column_names)
+        data = [self.identifiers.take(self.rows).reset_index(drop=True)] + fields[:2] + [columns] + fields[2:]
+        return pd.DataFrame(dict(zip(output_columns, data)))
+
+
+def match_table(matcher, metadata_df, selected_columns, identifier_column, scan_stats=None, profiler=None,
+                normalized_columns=None):
+    """Find matches one column at a time like `match_columns`, but return them as a compact `MatchTable`.
+
+    Parameters are those of `match_columns`.
+
+    Returns:
+    MatchTable: The matches, in the same order as a row-by-row scan.
+
+    """
+    hits = find_hits(matcher, metadata_df, selected_columns, scan_stats, profiler, normalized_columns)
+    return MatchTable.from_hits(hits, matcher.entries, metadata_df[identifier_column], selected_columns)
+
+
+class MatcherCache:
+    """On-disk cache of compiled matchers, keyed by lexicon content and selected categories.
+
+    Entries are pickled `LexiconMatcher` objects. When the cache grows past `max_bytes`,
+    the least recently used entries are evicted.
+
+    """
+
+    VERSION = 3  # Bump whenever LexiconMatcher changes shape, so stale pickles are ignored
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        """Open (and create if needed) a cache directory.
+
+        Parameters:
+        directory (str): Directory holding the cached matchers.
+        max_bytes (int): Total size the cache is trimmed back to after each store.
+
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, lexicon_digest, categories, fold_diacritics=False):
+        """Build the cache key for a lexicon and a category selection.
+
+        Parameters:
+        lexicon_digest (str): SHA-256 hex digest of the lexicon file contents.
+        categories (list of str): Selected category names; their order does not matter.
+        fold_diacritics (bool): Whether the matcher's normalizer folds diacritics.
+
+        Returns:
+        str: Cache key.
+
+        """
+        selection = "\n".join(sorted(set(categories))) + f"\nv{self.VERSION}"
+        if fold_diacritics:
+            selection += "\nfold-diacritics"
+        return f"{lexicon_digest}-{hashlib.sha256(selection.encode('utf-8')).hexdigest()[:16]}"
+
+    def get(self, key):
+        """Return the cached matcher for a key, or None if it is missing or unreadable."""
+        path = os.path.join(self.directory, key + ".pickle")
+        try:
+            with open(path, 'rb') as cache_file:
+                matcher = pickle.load(cache_file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        os.utime(path)  # Mark as recently used
+        return matcher
+
+    def put(self, key, matcher):
+        """Store a matcher under a key, then evict old entries if the cache is over its size limit."""
+        path = os.path.join(self.directory, key + ".pickle")
+        temp_path = path + f".{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as cache_file:
+            pickle.dump(matcher, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def invalidate(self, lexicon_digest=None):
+        """Remove the cached matchers of one lexicon, or every entry if no digest is given.
+
+        Parameters:
+        lexicon_digest (str): SHA-256 hex digest of the lexicon whose entries should be removed.
+
+        Returns:
+        int: Number of entries removed.
+
+        """
+        removed = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(".pickle") and (lexicon_digest is None or name.startswith(lexicon_digest + "-")):
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        return removed
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in `max_bytes`."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pickle"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for mtime, size, name in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+
+class Profiler:
+    """Opt-in record of where a MaRMAT run spends its time and memory.
+
+    Phases (reading files, filtering categories, compiling, matching, printing, writing) are
+    timed and their Python memory use traced with `tracemalloc`. In-process columnar scans also
+    record time per column and, for free-text matching, the number and cost of candidate checks
+    per term, so expensive terms and heavy columns stand out.
+
+    """
+
+    def __init__(self):
+        """Start tracing memory allocations."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.phases = {}  # Phase name -> [calls, seconds, peak bytes, net bytes]
+        self.columns = {}  # Column -> [seconds, text cells, distinct values, matches]
+        self.terms = {}  # Normalized term -> [candidate checks, seconds]
+        self.term_matches = collections.Counter()  # (term, category) -> matches
+        self.normalizer = TextNormalizer()  # The profiled matcher's, to look terms up by normalized form
+        self.open_peaks = []  # Highest traced memory seen so far by each open phase, innermost last
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time a phase of the run and measure the memory it allocates.
+
+        Phases may be nested: an inner phase's peak also counts towards the phases around it.
+
+        Parameters:
+        name (str): Phase name; repeated phases are added together.
+
+        """
+        start_memory, peak_so_far = tracemalloc.get_traced_memory()
+        if self.open_peaks:
+            # Resetting the peak below would lose what the enclosing phase has seen so far
+            self.open_peaks[-1] = max(self.open_peaks[-1], peak_so_far)
+        tracemalloc.reset_peak()
+        self.open_peaks.append(start_memory)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            peak_memory = max(peak_memory, self.open_peaks.pop())
+            if self.open_peaks:
+                self.open_peaks[-1] = max(self.open_peaks[-1], peak_memory)
+            record = self.phases.setdefault(name, [0, 0.0, 0, 0])
+            record[0] += 1
+            record[1] += seconds
+            record[2] = max(record[2], peak_memory - start_memory)
+            record[3] += current_memory - start_memory
+
+    def add_column(self, col, seconds, cells, distinct_values):
+        """Record the scan of one column."""
+        record = self.columns.setdefault(col, [0.0, 0, 0, 0])
+        record[0] += seconds
+        record[1] += cells
+        record[2] += distinct_values
+
+    def scan_texts(self, matcher, texts):
+        """Match a column of distinct normalized values, timing each term's candidate checks.
+
+        Gives the same results as `matcher.scan_texts`. Only a `LexiconMatcher` whose terms all
+        start with a word character checks terms one at a time; other matchers are run as is.
+
+        """
+        self.normalizer = matcher.normalizer
+        if not isinstance(matcher, LexiconMatcher) or matcher.unanchored:
+            return matcher.scan_texts(texts)
+        results = []
+        words = texts.str.findall(WORD_PATTERN).tolist()
+        for text, text_words in zip(texts.tolist(), words):
+            found = set()
+            for word in matcher.word_index.keys() & text_words:
+                for pattern_id in matcher.word_index[word]:
+                    start = time.perf_counter()
+                    if matcher.occurs(text, pattern_id):
+                        found.add(pattern_id)
+                    record = self.terms.setdefault(matcher.patterns[pattern_id], [0, 0.0])
+                    record[0] += 1
+                    record[1] += time.perf_counter() - start
+            results.append(sorted(index for pattern_id in found for index in matcher.pattern_entries[pattern_id]))
+        return results
+
+    def count_matches(self, matches):
+        """Tally matches per term and per column."""
+        for match in matches:
+            self.term_matches[(match[1], match[2])] += 1
+            self.columns.setdefault(match[3], [0.0, 0, 0, 0])[3] += 1
+
+    def report(self, top=25):
+        """Return the profile as plain text.
+
+        Parameters:
+        top (int): Number of terms listed in each term table.
+
+        Returns:
+        str: The report.
+
+        """
+        lines = ["Phases", f"{'phase':<24} {'calls':>6} {'seconds':>10} {'peak MB':>9} {'net MB':>9}"]
+        for name, (calls, seconds, peak, net) in self.phases.items():
+            lines.append(f"{name:<24} {calls:>6} {seconds:>10.4f} {peak / 1048576:>9.2f} {net / 1048576:>9.2f}")
+
+        lines += ["", "Columns", f"{'column':<24} {'seconds':>10} {'text cells':>11} {'distinct':>9} {'matches':>9}"]
+        for col, (seconds, cells, distinct_values, matches) in sorted(self.columns.items(), key=lambda item: -item[1][0]):
+            lines.append(f"{str(col):<24} {seconds:>10.4f} {cells:>11} {distinct_values:>9} {matches:>9}")
+
+        term_rows = {}
+        for (term, category), matches in self.term_matches.items():
+            term_rows[(term, category)] = self.terms.get(self.normalizer.normalize(str(term)), [0, 0.0]) + [matches]
+        matched_terms = {self.normalizer.normalize(str(term)) for term, category in term_rows}
+        for term, (checks, seconds) in self.terms.items():
+            if term not in matched_terms:
+                term_rows[(term, '')] = [checks, seconds, 0]
+        header = f"{'term':<40} {'category':<20} {'checks':>8} {'seconds':>10} {'matches':>9}"
+        for title, sort_key in (("Terms by check time", lambda item: -item[1][1]),
+                                ("Terms by matches", lambda item: -item[1][2])):
+            lines += ["", f"{title} (top {top})", header]
+            for (term, category), (checks, seconds, matches) in sorted(term_rows.items(), key=sort_key)[:top]:
+                lines.append(f"{str(term)[:40]:<40} {str(category)[:20]:<20} {checks:>8} {seconds:>10.4f} {matches:>9}")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, file_path, top=25):
+        """Write the plain-text report to a file."""
+        with open(file_path, 'w', encoding='utf-8') as report_file:
+            report_file.write(self.report(top))
+
+
+def read_state(file_path):
+    """Read an incremental-run state file, returning None if it is missing or unreadable."""
+    try:
+        with open(file_path, 'rb') as state_file:
+            return pickle.load(state_file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+
+
+def write_state(file_path, state):
+    """Write an incremental-run state file, replacing the old one only once the new one is complete."""
+    temp_path = file_path + f".{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as state_file:
+        pickle.dump(state, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, file_path)
+
+
+# Each worker process receives the compiled lexicon once, when the pool starts
+_worker_matcher = None
+
+
+def _init_worker(matcher):
+    global _worker_matcher
+    _worker_matcher = matcher
+
+
+def _match_shard(shard, selected_columns, identifier_column):
+    scan_stats = collections.Counter()
+    matches = match_columns(_worker_matcher, shard, selected_columns, identifier_column, scan_stats)
+    return matches, scan_stats
+
+
+def _match_shard_arrays(shard, selected_columns):
+    # Only the integer arrays of a MatchTable travel back to the parent process
+    scan_stats = collections.Counter()
+    hits = find_hits(_worker_matcher, shard, selected_columns, scan_stats)
+    table = MatchTable.from_hits(hits, _worker_matcher.entries, None, selected_columns)
+    return table.rows, table.entry_ids, table.column_codes, scan_stats
+
+
+def open_compressed(file_path):
+    """Open a text file for writing UTF-8, compressing it on the fly if it ends in ".gz" or ".zst"."""
+    compression = compression_of(file_path)
+    if compression == 'gzip':
+        return gzip.open(file_path, 'wt', newline='', encoding='utf-8')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("Writing .zst files needs the zstandard package: pip install zstandard")
+        writer = zstandard.ZstdCompressor().stream_writer(open(file_path, 'wb'), closefd=True)
+        return io.TextIOWrapper(writer, encoding='utf-8', newline='')
+    return open(file_path, 'w', newline='', encoding='utf-8')
+
+
+class CSVSink:
+    """Match sink that appends each batch to a CSV file as it arrives, gzip or zstd compressed if
+    the file name ends in ".gz" or ".zst"."""
+
+    def __init__(self, output_file, columns=MATCH_COLUMNS):
+        """Create the file and write its header.
+
+        Parameters:
+        output_file (str): Path to the output CSV file.
+        columns (list of str): Output column names, e.g. from `MaRMAT.output_columns`.
+
+        """
+        self.output_file = output_file
+        self.columns = columns
+        self.csv_file = open_compressed(output_file)
+        pd.DataFrame(columns=columns).to_csv(self.csv_file, index=False)
+
+    def write(self, matches):
+        self.write_frame(pd.DataFrame(matches, columns=self.columns))
+
+    def write_frame(self, matches_df):
+        """Append a DataFrame of matches."""
+        matches_df.to_csv(self.csv_file, header=False, index=False)
+
+    def close(self):
+        """Close the file and return its path."""
+        self.csv_file.close()
+        return self.output_file
+
+
+class ArrowSink:
+    """Base of the sinks that write pyarrow tables; text columns are dictionary-encoded, so each
+    distinct term, category and column name is stored once per batch rather than once per match.
+    Identifiers are always written as plain text, since one batch may hold only numbers and the
+    next text identifiers."""
+
+    def __init__(self, output_file, columns=MATCH_COLUMNS):
+        """Prepare the output file; it is created when the first batch arrives.
+
+        Parameters:
+        output_file (str): Path to the output file.
+        columns (list of str): Output column names, e.g. from `MaRMAT.output_columns`.
+
+        """
+        if pyarrow is None:
+            raise ImportError("Writing Parquet and Arrow files needs the pyarrow package: pip install pyarrow")
+        self.output_file = output_file
+        self.columns = columns
+        self.schema = None  # Fixed by the first batch, so every batch is written with the same types
+        self.writer = None
+
+    def open_writer(self, schema):
+        raise NotImplementedError
+
+    def table(self, matches_df):
+        """Convert a DataFrame of matches to a pyarrow Table with dictionary-encoded text columns."""
+        if 'Identifier' in matches_df.columns:
+            identifiers = matches_df['Identifier']
+            matches_df = matches_df.assign(Identifier=identifiers.astype(object).map(
+                lambda identifier: None if pd.isna(identifier) else str(identifier)))
+        table = pyarrow.Table.from_pandas(matches_df, preserve_index=False)
+        for position, field in enumerate(table.schema):
+            if field.name == 'Identifier':
+                table = table.set_column(position, field.name, table.column(position).cast(pyarrow.string()))
+            elif pyarrow.types.is_string(field.type) or pyarrow.types.is_large_string(field.type):
+                column = table.column(position).cast(pyarrow.string()).dictionary_encode()
+                table = table.set_column(position, field.name, column)
+        if self.schema is None:
+            self.schema = table.schema
+            self.writer = self.open_writer(self.schema)
+        elif table.schema != self.schema:
+            table = table.cast(self.schema)
+        return table
+
+    def write(self, matches):
+        if matches:
+            self.write_frame(pd.DataFrame(matches, columns=self.columns))
+
+    def write_frame(self, matches_df):
+        """Append a DataFrame of matches as one batch."""
+        if len(matches_df):
+            table = self.table(matches_df)  # Opens the writer on the first batch
+            self.writer.write_table(table)
+
+    def close(self):
+        """Finish the file and return its path; without any matches, an empty file with string columns is written."""
+        if self.writer is None:
+            self.writer = self.open_writer(pyarrow.schema(
+                [(col, pyarrow.string() if col == 'Identifier' else pyarrow.dictionary(pyarrow.int32(), pyarrow.string()))
+                 for col in self.columns]))
+        self.writer.close()
+        return self.output_file
+
+
+class ParquetSink(ArrowSink):
+    """Match sink that writes each batch as a row group of a Parquet file (needs pyarrow)."""
+
+    def open_writer(self, schema):
+        return pyarrow.parquet.ParquetWriter(self.output_file, schema, use_dictionary=True)
+
+
+class ArrowStreamSink(ArrowSink):
+    """Match sink that writes each batch to an Arrow IPC stream file (needs pyarrow)."""
+
+    def open_writer(self, schema):
+        return pyarrow.ipc.new_stream(self.output_file, schema)
+
+
+MATCH_SINKS = {
+    '.parquet': ParquetSink,
+    '.arrow': ArrowStreamSink,
+    '.arrows': ArrowStreamSink,
+}
+
+
+def match_sink(output_file, columns=MATCH_COLUMNS):
+    """Open the sink for an output file by its extension: Parquet (".parquet"), Arrow IPC stream
+    (".arrow", ".arrows"), or otherwise CSV, compressed for ".csv.gz" and ".csv.zst".
+
+    Parameters:
+    output_file (str): Path to the output file.
+    columns (list of str): Output column names, e.g. from `MaRMAT.output_columns`.
+
+    Returns:
+    CSVSink, ParquetSink or ArrowStreamSink: The sink.
+
+    """
+    sink_class = MATCH_SINKS.get(os.path.splitext(output_file)[1].lower(), CSVSink)
+    return sink_class(output_file, columns)
+
+
+class DataFrameSink:
+    """Match sink that collects every batch into one DataFrame."""
+
+    def __init__(self, columns=MATCH_COLUMNS):
+        self.columns = columns
+        self.matches = []
+
+    def write(self, matches):
+        self.matches.extend(matches)
+
+    def close(self):
+        """Return the collected matches as a DataFrame."""
+        return pd.DataFrame(self.matches, columns=self.columns)
+
+
+class CallbackSink:
+    """Match sink that calls a function with every match (or every batch, with `batches=True`)."""
+
+    def __init__(self, callback, batches=False):
+        self.callback = callback
+        self.batches = batches
+        self.count = 0
+
+    def write(self, matches):
+        if self.batches:
+            self.callback(matches)
+        else:
+            for match in matches:
+                self.callback(match)
+        self.count += len(matches)
+
+    def close(self):
+        """Return the number of matches passed on."""
+        return self.count
+
+
+def write_matches(matches, sink, batch_size=SINK_BATCH_SIZE):
+    """Feed matches, e.g. from `MaRMAT.iter_matches`, to a sink in batches, then close the sink.
+
+    Parameters:
+    matches (iterable of tuple): Matches to write.
+    sink (CSVSink, DataFrameSink or CallbackSink): Destination; any object with `write(list)`
+        and `close()` methods will do.
+    batch_size (int): Number of matches handed to the sink at a time.
+
+    Returns:
+    The sink's `close()` result: the CSV path, the DataFrame or the number of matches.
+
+    """
+    matches = iter(matches)
+    try:
+        batch = list(itertools.islice(matches, batch_size))
+        while batch:
+            sink.write(batch)
+            batch = list(itertools.islice(matches, batch_size))
+    finally:
+        result = sink.close()
+    return result
+
+
+def _assess_file(file_path, output_file, selected_columns, identifier_column, output_columns, chunk_size):
+    return assess_file(_worker_matcher, file_path, output_file, selected_columns, identifier_column, output_columns,
+                       chunk_size)
+
+
+def is_metadata_file(file_path):
+    """Return True if a file's extension is one of `METADATA_READERS`, optionally compressed."""
+    return os.path.splitext(strip_compression_suffix(file_path))[1].lower() in METADATA_READERS
+
+
+def expand_metadata_paths(patterns):
+    """Turn file names, glob patterns and directories into a list of metadata files.
+
+    Parameters:
+    patterns (list of str): File paths, glob patterns such as "exports/*.csv", or directories,
+        which stand for every metadata file directly inside them (any format in `METADATA_READERS`,
+        compressed or not).
+
+    Returns:
+    list of str: Matching files, each listed once, in the order given (sorted within a pattern).
+
+    """
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(sorted(path for path in glob.glob(os.path.join(pattern, '*'))
+                                if os.path.isfile(path) and is_metadata_file(path)))
+        elif glob.has_magic(pattern):
+            paths.extend(sorted(glob.glob(pattern)))
+        else:
+            paths.append(pattern)
+    return list(dict.fromkeys(paths))
+
+
+def batch_output_files(file_paths, output_dir, output_format='csv'):
+    """Name an output file in `output_dir` for each metadata file, e.g. "records.csv" -> "records-matches.csv"
+    (and "records.tsv.gz" -> "records-matches.csv").
+
+    Inputs with the same file name in different directories get numbered outputs ("records-matches-2.csv").
+    `output_format` is the extension of the outputs, e.g. "csv.gz" or "parquet" (see `match_sink`).
+
+    """
+    output_files = []
+    used = set()
+    for file_path in file_paths:
+        stem = os.path.splitext(os.path.basename(strip_compression_suffix(file_path)))[0]
+        name = f"{stem}-matches.{output_format}"
+        number = 1
+        while name in used:
+            number += 1
+            name = f"{stem}-matches-{number}.{output_format}"
+        used.add(name)
+        output_files.append(os.path.join(output_dir, name))
+    return output_files
+
+
+def assess_file(matcher, file_path, output_file, selected_columns, identifier_column, output_columns,
+                chunk_size=BATCH_CHUNK_SIZE):
+    """Stream one metadata file through a compiled matcher, writing its matches as each chunk is matched.
+
+    Parameters:
+    matcher (LexiconMatcher or HeadingIndex): Compiled lexicon to match against.
+    file_path (str): Path to the metadata file.
+    output_file (str): Path to the output file; its extension picks the format (see `match_sink`).
+    selected_columns (list of str): List of column names from metadata for matching.
+    identifier_column (str): Name of the identifier column in the metadata.
+    output_columns (list of str): Header of the output file.
+    chunk_size (int): Number of metadata rows read at a time.
+
+    Returns:
+    tuple: (rows read, matches written, scan statistics Counter).
+
+    """
+    needed_columns = list(dict.fromkeys(selected_columns + [identifier_column]))
+    scan_stats = collections.Counter()
+    rows = 0
+    total_matches = 0
+    sink = None
+    try:
+        sink = match_sink(output_file, output_columns)
+        for chunk in read_metadata_chunks(file_path, needed_columns, chunk_size):
+            chunk_matches = match_columns(matcher, chunk, selected_columns, identifier_column, scan_stats)
+            sink.write(chunk_matches)
+            rows += len(chunk)
+            total_matches += len(chunk_matches)
+        sink.close()
+    except Exception:
+        # Don't leave a partial results file that looks like a finished one
+        if sink is not None:
+            with contextlib.suppress(Exception):
+                sink.close()
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+    return rows, total_matches, scan_stats
+
 
 class MaRMAT:
     """A tool for assessing metadata and identifying matches based on a provided lexicon."""
 
-    def __init__(self):
-        """Initialize the assessment tool."""
+    def __init__(self, matcher_cache=None, profiler=None):
+        """Initialize the assessment tool.
+
+        Parameters:
+        matcher_cache (MatcherCache): Optional on-disk cache for compiled lexicons.
+        profiler (Profiler): Optional instrumentation of phases, columns and terms.
+
+        """
         self.lexicon_df = None
+        self.lexicon_digest = None  # SHA-256 of the loaded lexicon file, used as a cache key
+        self.matcher_cache = matcher_cache
+        self.profiler = profiler
         self.metadata_df = None
         self.columns = []  # List of all available columns in the metadata
         self.categories = []  # List of all available categories in the lexicon
         self.selected_columns = []  # List of columns selected for matching
         self.identifier_column = None  # Identifier column used to uniquely identify rows
+        self.metadata_file = None  # Path of metadata that is streamed rather than loaded
+        self.chunk_size = None  # Number of metadata rows read at a time when streaming
+        self.metadata_path = None  # Path of metadata whose selected columns are read when matching starts
+        self.metadata_encoding = None  # Encoding detected for the metadata file
+        self.metadata_reader = None  # MetadataReader for the metadata file's format
+        self.scan_stats = collections.Counter()  # Text cells and distinct values scanned by the last run
+        self.fold_diacritics = False  # Strip accents from terms and text before matching
+        self.normalized_columns = {}  # (column, fold_diacritics) -> output of normalize_column
+        self.normalized_df = None  # The metadata DataFrame normalized_columns was computed from
 
     def load_lexicon(self, file_path):
         """Load the lexicon file.
@@ -21,24 +1660,108 @@ class MaRMAT:
 
         """
         try:
-            self.lexicon_df = pd.read_csv(file_path, encoding='latin1')
+            with self.profile('read lexicon'):
+                with open(file_path, 'rb') as lexicon_file:
+                    data = lexicon_file.read()
+                self.lexicon_df = pd.read_csv(io.BytesIO(data), encoding=sniff_encoding(data))
+                self.lexicon_digest = hashlib.sha256(data).hexdigest()
             print("Lexicon loaded successfully.")
         except Exception as e:
             print(f"An error occurred while loading lexicon: {e}")
 
-    def load_metadata(self, file_path):
+    def load_lexicons(self, lexicon_files):
+        """Load several lexicon files as one lexicon, so a single scan matches all of them.
+
+        Each term remembers the lexicon it came from, and the results gain a "Lexicon" column.
+
+        Parameters:
+        lexicon_files (dict): Source name -> path of the lexicon CSV file, e.g.
+            {'reparative': 'lexicon-reparative-metadata.csv', 'LCSH': 'lexicon-LCSH.csv'}.
+
+        """
+        try:
+            lexicons = []
+            digests = []
+            with self.profile('read lexicon'):
+                for source, file_path in lexicon_files.items():
+                    with open(file_path, 'rb') as lexicon_file:
+                        data = lexicon_file.read()
+                    lexicon_df = pd.read_csv(io.BytesIO(data), encoding=sniff_encoding(data))
+                    lexicons.append(lexicon_df[['term', 'category']].assign(source=source))
+                    digests.append(f"{source}\n{hashlib.sha256(data).hexdigest()}")
+                self.lexicon_df = pd.concat(lexicons, ignore_index=True)
+                # Covers the names and the order of the lexicons as well as their contents
+                self.lexicon_digest = hashlib.sha256("\n".join(digests).encode('utf-8')).hexdigest()
+            print(f"{len(lexicons)} lexicons loaded successfully.")
+        except Exception as e:
+            print(f"An error occurred while loading lexicons: {e}")
+
+    def load_metadata(self, file_path, chunk_size=None, deferred=False):
         """Load the metadata file.
 
+        The file's encoding is detected first, so UTF-8 exports are read as UTF-8 and anything else
+        as Latin-1. Besides CSV, the file can be TSV (".tsv"), JSON Lines (".jsonl"), Parquet
+        (".parquet") or OAI-PMH XML (".xml"), optionally compressed (".gz", ".zst"); see
+        `METADATA_READERS`. As the fields of XML records are only known once read, `deferred`
+        loads XML files in full.
+
         Parameters:
-        file_path (str): Path to the metadata CSV file.
+        file_path (str): Path to the metadata file.
+        chunk_size (int): If given, only the header is read now and the rows are streamed through
+            matching this many at a time, so memory use depends on the chunk size, not the file size.
+        deferred (bool): Only read the header now; when matching starts, parse just the selected
+            columns and the identifier column (see `read_selected_columns`).
 
         """
         try:
-            self.metadata_df = pd.read_csv(file_path, encoding='latin1')
+            self.metadata_df = None
+            self.metadata_file = None
+            self.metadata_path = None
+            self.chunk_size = None
+            self.metadata_reader = metadata_reader(file_path)
+            self.metadata_encoding = self.metadata_reader.encoding
+            if chunk_size or deferred:
+                self.columns = self.metadata_reader.columns()
+            if deferred and not chunk_size and isinstance(self.metadata_reader, XMLReader):
+                deferred = False
+            if chunk_size:
+                self.metadata_file = file_path
+                self.chunk_size = chunk_size
+                print("Metadata opened for streaming.")
+                return
+            if deferred:
+                self.metadata_path = file_path
+                print("Metadata header read; the selected columns will be loaded when matching starts.")
+                return
+            with self.profile('read metadata'):
+                self.metadata_df = self.metadata_reader.read()
+            self.columns = self.metadata_df.columns.tolist()
             print("Metadata loaded successfully.")
         except Exception as e:
             print(f"An error occurred while loading metadata: {e}")
 
+    def read_selected_columns(self, selected_columns=None):
+        """Parse the selected and identifier columns of metadata loaded with `deferred=True`.
+
+        Columns that are already loaded are not read again.
+
+        Parameters:
+        selected_columns (list of str): Columns to read instead of `selected_columns`.
+
+        """
+        if selected_columns is None:
+            selected_columns = self.selected_columns
+        needed_columns = list(dict.fromkeys(selected_columns + [self.identifier_column]))
+        if self.metadata_df is not None and all(col in self.metadata_df.columns for col in needed_columns):
+            return
+        if self.metadata_df is not None:
+            needed_columns = list(dict.fromkeys(self.metadata_df.columns.tolist() + needed_columns))
+        with self.profile('read metadata'):
+            metadata_df = self.metadata_reader.read(usecols=needed_columns)
+        # usecols keeps file order; put the columns in the order they were asked for
+        self.metadata_df = metadata_df[needed_columns]
+        print(f"Loaded {len(needed_columns)} of {len(self.columns)} metadata columns.")
+
     def select_columns(self, columns):
         """Select columns from the metadata for matching.
 
@@ -66,60 +1789,661 @@ class MaRMAT:
         """
         self.categories = categories
 
-    def perform_matching(self, output_file):
-        """Perform matching between selected columns and categories and save results to a CSV file.
+    def perform_matching(self, output_file, columnar=True, workers=1, headings=False, state_file=None, show=True):
+        """Perform matching between selected columns and categories and save results to a file.
 
         Parameters:
-        output_file (str): Path to the output CSV file to save matching results.
+        output_file (str): Path to the output file to save matching results: CSV, optionally
+            compressed (".csv.gz", ".csv.zst"), Parquet (".parquet") or Arrow IPC (".arrow").
+        columnar (bool): Scan whole columns at a time instead of walking the metadata row by row.
+        workers (int): Number of processes to match in; results are identical to a single process.
+        headings (bool): Treat the selected columns as LCSH subject headings (see `HeadingIndex`)
+            and add a "Match Type" column to the results.
+        state_file (str): If given, only rows that are new or changed since the run that wrote this
+            state file are rescanned (see `find_matches_incremental`).
+        show (bool): Print the results table before saving it.
 
         """
-        if self.lexicon_df is None or self.metadata_df is None:
+        if self.lexicon_df is None or (self.metadata_df is None and self.metadata_file is None
+                                       and self.metadata_path is None):
             print("Please load lexicon and metadata files first.")
             return
 
-        matches = self.find_matches(self.selected_columns, self.categories)
-        matches_df = pd.DataFrame(matches, columns=['Identifier', 'Term', 'Category', 'Column'])
-        print(matches_df)
+        if self.metadata_path is not None:
+            try:
+                self.read_selected_columns()
+            except Exception as e:
+                print(f"An error occurred while loading metadata: {e}")
+                return
+
+        if self.metadata_file is not None:
+            if state_file is not None:
+                print("Incremental matching needs the metadata loaded in full; rescanning every row.")
+            self.perform_matching_streamed(output_file, workers=workers, headings=headings)
+            return
+
+        if state_file is not None:
+            matches = self.find_matches_incremental(self.selected_columns, self.categories, state_file,
+                                                    headings=headings)
+        else:
+            matches = self.find_matches(self.selected_columns, self.categories, columnar=columnar, workers=workers,
+                                        headings=headings)
+        if isinstance(matches, MatchTable):
+            matches_df = matches.to_frame(self.output_columns(headings))
+        else:
+            matches_df = pd.DataFrame(matches, columns=self.output_columns(headings))
+        if show:
+            with self.profile('print results'):
+                print(matches_df)
+        self.report_scan_stats()
 
         """Write results to CSV"""
         try:
-            matches_df.to_csv(output_file, index=False)
+            with self.profile('write results'):
+                sink = match_sink(output_file, matches_df.columns.tolist())
+                sink.write_frame(matches_df)
+                sink.close()
             print(f"Results saved to {output_file}")
         except Exception as e:
             print(f"An error occurred while saving results: {e}")
 
-    def find_matches(self, selected_columns, selected_categories):
+    def perform_matching_streamed(self, output_file, workers=1, headings=False):
+        """Match the streamed metadata chunk by chunk, appending each chunk's results to the output file.
+
+        Parameters:
+        output_file (str): Path to the output file to save matching results (see `match_sink`).
+        workers (int): Number of processes to match chunks in; results are written in file order.
+        headings (bool): Treat the selected columns as LCSH subject headings.
+
+        """
+        matcher = self.compile_matcher(self.categories, headings=headings)
+        output_columns = self.output_columns(headings)
+        needed_columns = list(dict.fromkeys(self.selected_columns + [self.identifier_column]))
+        executor = None
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matcher,))
+        pending = collections.deque()  # Chunks in flight, oldest first
+        self.scan_stats = collections.Counter()
+        rows = 0
+        total_matches = 0
+        sink = None
+
+        def write_oldest():
+            nonlocal total_matches
+            chunk_matches = pending.popleft()
+            if executor is not None:
+                chunk_matches, chunk_stats = chunk_matches.result()
+                self.scan_stats.update(chunk_stats)
+            if self.profiler is not None:
+                self.profiler.count_matches(chunk_matches)
+            sink.write(chunk_matches)
+            total_matches += len(chunk_matches)
+
+        try:
+            with self.profile('stream chunks'):
+                sink = match_sink(output_file, output_columns)
+                reader = self.metadata_reader.chunks(needed_columns, self.chunk_size)
+                for chunk in reader:
+                    rows += len(chunk)
+                    if executor is None:
+                        pending.append(match_columns(matcher, chunk, self.selected_columns, self.identifier_column,
+                                                     self.scan_stats, self.profiler))
+                    else:
+                        pending.append(executor.submit(_match_shard, chunk, self.selected_columns,
+                                                       self.identifier_column))
+                    # Bound the number of chunks held in memory at once
+                    while len(pending) >= max(workers, 1) * 2:
+                        write_oldest()
+                    print(f"Processed {rows} rows.")
+                while pending:
+                    write_oldest()
+                sink.close()
+                sink = None
+            print(f"{total_matches} matches found in {rows} rows.")
+            self.report_scan_stats()
+            print(f"Results saved to {output_file}")
+        except Exception as e:
+            print(f"An error occurred while matching streamed metadata: {e}")
+        finally:
+            if sink is not None:
+                # The run stopped part way: don't leave a partial results file that looks like a finished one
+                with contextlib.suppress(Exception):
+                    sink.close()
+                with contextlib.suppress(OSError):
+                    os.remove(output_file)
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def output_columns(self, headings=False):
+        """Return the column names of the match results.
+
+        Parameters:
+        headings (bool): Whether the results come from subject-heading matching.
+
+        Returns:
+        list of str: Output column names.
+
+        """
+        columns = MATCH_COLUMNS + (HeadingIndex.extra_columns if headings else LexiconMatcher.extra_columns)
+        if self.lexicon_df is not None and 'source' in self.lexicon_df.columns:
+            columns = columns + ['Lexicon']  # Several lexicons were loaded with `load_lexicons`
+        return columns
+
+    def compile_matcher(self, selected_categories, headings=False):
+        """Compile the lexicon terms in the selected categories into a matcher.
+
+        Parameters:
+        selected_categories (list of str): List of category names from the lexicon for matching.
+        headings (bool): Build a `HeadingIndex` of subject headings instead of a free-text matcher.
+
+        Returns:
+        LexiconMatcher or HeadingIndex: Matcher over the selected terms, in lexicon order.
+
+        """
+        if headings:
+            # Plain hash tables, quicker to rebuild than to unpickle
+            with self.profile('filter categories'):
+                lexicon_df = self.lexicon_df[self.lexicon_df['category'].isin(selected_categories)]
+            with self.profile('compile lexicon'):
+                return HeadingIndex(lexicon_df['term'], lexicon_df['category'],
+                                    normalizer=TextNormalizer(self.fold_diacritics), sources=lexicon_df.get('source'))
+
+        key = None
+        if self.matcher_cache is not None and self.lexicon_digest is not None:
+            key = self.matcher_cache.key(self.lexicon_digest, selected_categories, self.fold_diacritics)
+            with self.profile('load cached lexicon'):
+                matcher = self.matcher_cache.get(key)
+            if matcher is not None:
+                return matcher
+
+        with self.profile('filter categories'):
+            lexicon_df = self.lexicon_df[self.lexicon_df['category'].isin(selected_categories)]
+        with self.profile('compile lexicon'):
+            matcher = LexiconMatcher(lexicon_df['term'], lexicon_df['category'],
+                                     normalizer=TextNormalizer(self.fold_diacritics), sources=lexicon_df.get('source'))
+        if key is not None:
+            try:
+                self.matcher_cache.put(key, matcher)
+            except OSError as e:
+                print(f"Could not cache the compiled lexicon: {e}")
+        return matcher
+
+    def find_matches(self, selected_columns, selected_categories, columnar=True, workers=1, headings=False):
         """Find matches between metadata and lexicon based on selected columns and categories.
 
         Parameters:
         selected_columns (list of str): List of column names from metadata for matching.
         selected_categories (list of str): List of category names from the lexicon for matching.
+        columnar (bool): Scan whole columns at a time instead of walking the metadata row by row.
+        workers (int): Number of processes to shard the columnar scan across.
+        headings (bool): Treat the selected columns as LCSH subject headings.
+
+        Returns:
+        MatchTable: The matches; iterating it yields tuples (Identifier, Term, Category, Column),
+            plus (Match Type) when matching headings, and `to_frame` turns it into a DataFrame.
+
+        """
+        matcher = self.compile_matcher(selected_categories, headings=headings)
+        self.scan_stats = collections.Counter()
+        with self.profile('match'):
+            if columnar and workers > 1:
+                matches = self.find_matches_parallel(matcher, selected_columns, workers)
+            elif columnar:
+                normalized_columns = self.normalize_columns(selected_columns, matcher.normalizer)
+                matches = match_table(matcher, self.metadata_df, selected_columns, self.identifier_column,
+                                      self.scan_stats, self.profiler, normalized_columns)
+            else:
+                entry_ids = {entry: entry_id for entry_id, entry in enumerate(matcher.entries)}
+                hits = []
+                for row_position, (index, row) in enumerate(self.metadata_df.iterrows()):
+                    for col_position, col in enumerate(selected_columns):
+                        if isinstance(row[col], str):
+                            entries = [entry_ids[entry] for entry in matcher.match(row[col])]
+                            if entries:
+                                hits.append((row_position, col_position, entries))
+                matches = MatchTable.from_hits(hits, matcher.entries, self.metadata_df[self.identifier_column],
+                                               selected_columns)
+        if self.profiler is not None:
+            self.profiler.count_matches(matches)
+        return matches
+
+    def normalize_columns(self, selected_columns, normalizer):
+        """Return the normalized form of the selected columns, normalizing each column only once per load.
+
+        The result is kept until a different metadata DataFrame is loaded; call
+        `normalized_columns.clear()` after editing `metadata_df` in place.
+
+        Parameters:
+        selected_columns (list of str): List of column names from metadata for matching.
+        normalizer (TextNormalizer): Normalization to apply.
 
         Returns:
-        list of tuple: List of tuples containing matched results (Identifier, Term, Category, Column).
+        dict: Output of `normalize_column` by column name.
 
         """
-        matches = []
-        lexicon_df = self.lexicon_df[self.lexicon_df['category'].isin(selected_categories)]
-        for index, row in self.metadata_df.iterrows():
+        if self.normalized_df is not self.metadata_df:
+            self.normalized_columns = {}
+            self.normalized_df = self.metadata_df
+        with self.profile('normalize'):
             for col in selected_columns:
-                if isinstance(row[col], str):
-                    for term, category in zip(lexicon_df['term'], lexicon_df['category']):
-                        if re.search(r'\b' + re.escape(term.lower()) + r'\b', row[col].lower()):
-                            matches.append((row[self.identifier_column], term, category, col))
+                if (col, normalizer.fold_diacritics) not in self.normalized_columns:
+                    self.normalized_columns[(col, normalizer.fold_diacritics)] = normalize_column(
+                        self.metadata_df[col], normalizer)
+        return {col: self.normalized_columns[(col, normalizer.fold_diacritics)] for col in selected_columns}
+
+    def profile(self, name):
+        """Return a context manager that records a phase when profiling is enabled.
+
+        Parameters:
+        name (str): Phase name.
+
+        """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.phase(name)
+
+    def iter_matches(self, selected_columns=None, selected_categories=None, headings=False):
+        """Yield matches one at a time, without building the full result list or printing anything.
+
+        Loaded metadata is scanned MATCH_BLOCK_ROWS rows at a time, so the first matches arrive
+        without scanning the whole DataFrame; streamed metadata (see `load_metadata`) is matched
+        and yielded chunk by chunk.
+        Pass the generator to `write_matches` to save it through a sink.
+
+        Parameters:
+        selected_columns (list of str): Columns to match; defaults to `selected_columns`.
+        selected_categories (list of str): Categories to match; defaults to `categories`.
+        headings (bool): Treat the selected columns as LCSH subject headings.
+
+        Yields:
+        tuple: Matches in the same form and order as `find_matches`.
+
+        """
+        if selected_columns is None:
+            selected_columns = self.selected_columns
+        if selected_categories is None:
+            selected_categories = self.categories
+        matcher = self.compile_matcher(selected_categories, headings=headings)
+        self.scan_stats = collections.Counter()
+
+        if self.metadata_file is not None:
+            needed_columns = list(dict.fromkeys(selected_columns + [self.identifier_column]))
+            for chunk in self.metadata_reader.chunks(needed_columns, self.chunk_size):
+                yield from match_columns(matcher, chunk, selected_columns, self.identifier_column, self.scan_stats)
+            return
+
+        if self.metadata_path is not None:
+            self.read_selected_columns(selected_columns)
+        normalized_columns = self.normalize_columns(selected_columns, matcher.normalizer)
+        identifiers = self.metadata_df[self.identifier_column]
+        # Blocks are scanned in order, so the matches stay in row-major order
+        for block_start in range(0, len(self.metadata_df), MATCH_BLOCK_ROWS):
+            block_stop = block_start + MATCH_BLOCK_ROWS
+            block_normalized = {col: slice_normalized(normalized, block_start, block_stop)
+                                for col, normalized in normalized_columns.items()}
+            hits = find_hits(matcher, self.metadata_df.iloc[block_start:block_stop], selected_columns,
+                             self.scan_stats, self.profiler, block_normalized)
+            for row_position, col_position, entries in hits:
+                identifier = identifiers.iat[block_start + row_position]
+                col = selected_columns[col_position]
+                for index in entries:
+                    entry = matcher.entries[index]
+                    yield (identifier, entry[0], entry[1], col) + entry[2:]
+
+    def iter_record_matches(self, records, selected_columns=None, selected_categories=None, headings=False,
+                            chunk_size=BATCH_CHUNK_SIZE):
+        """Yield matches for records that arrive as a stream of dictionaries, without any intermediate file.
+
+        Parameters:
+        records (iterable of dict): Records, e.g. from `iter_oai_records`.
+        selected_columns (list of str): Fields to match; defaults to `selected_columns`.
+        selected_categories (list of str): Categories to match; defaults to `categories`.
+        headings (bool): Treat the selected fields as LCSH subject headings.
+        chunk_size (int): Number of records matched at a time.
+
+        Yields:
+        tuple: Matches in the same form as `find_matches`, in record order.
+
+        """
+        if selected_columns is None:
+            selected_columns = self.selected_columns
+        if selected_categories is None:
+            selected_categories = self.categories
+        matcher = self.compile_matcher(selected_categories, headings=headings)
+        self.scan_stats = collections.Counter()
+        needed_columns = list(dict.fromkeys(selected_columns + [self.identifier_column]))
+        for chunk in record_chunks(records, needed_columns, chunk_size):
+            yield from match_columns(matcher, chunk, selected_columns, self.identifier_column, self.scan_stats)
+
+    def find_matches_incremental(self, selected_columns, selected_categories, state_file, headings=False):
+        """Find matches, rescanning only the rows and lexicon terms that changed since the previous run.
+
+        The state file holds a fingerprint of every row's identifier and selected columns, together
+        with the lexicon terms that row matched, and the list of terms it was matched against. Rows
+        whose fingerprint is already stored reuse their matches; new and edited rows are scanned
+        against the whole lexicon. Terms added to the lexicon (or brought in by selecting another
+        category) are looked for in the reused rows only, and matches of terms that have been removed
+        are dropped without rescanning. A different column selection or matching mode invalidates
+        the whole state. The state file is then rewritten for this run.
+
+        Parameters:
+        selected_columns (list of str): List of column names from metadata for matching.
+        selected_categories (list of str): List of category names from the lexicon for matching.
+        state_file (str): Path to the state file; it is created if it does not exist.
+        headings (bool): Treat the selected columns as LCSH subject headings.
+
+        Returns:
+        list of tuple: The same matches as `find_matches`.
+
+        """
+        matcher = self.compile_matcher(selected_categories, headings=headings)
+        self.scan_stats = collections.Counter()
+        settings = {
+            'version': 2,
+            'pandas': pd.__version__,  # Row hashes are only guaranteed stable within a pandas version
+            'columns': list(selected_columns),
+            'identifier': self.identifier_column,
+            'headings': headings,
+            'fold_diacritics': self.fold_diacritics,
+            'sourced': matcher.sourced,
+        }
+        state = read_state(state_file)
+        if state is None or state['settings'] != settings:
+            state = {'settings': settings, 'terms': set(), 'rows': {}}
+
+        # Terms are identified by (term, category), as written in the lexicon, plus the lexicon they came from
+        def term_key(entry):
+            return entry[:2] + entry[-1:] if matcher.sourced else entry[:2]
+
+        terms = {term_key(entry) for entry in matcher.entries}
+        added_terms = list(dict.fromkeys(term_key(entry) for entry in matcher.entries
+                                         if term_key(entry) not in state['terms']))
+        removed_terms = state['terms'] - terms
+
+        with self.profile('match'):
+            needed_columns = list(dict.fromkeys(selected_columns + [self.identifier_column]))
+            fingerprints = pd.util.hash_pandas_object(self.metadata_df[needed_columns], index=False).tolist()
+
+            # Each row keeps (column position, matcher entry) hits, without those of removed terms
+            rows = {}
+            changed_positions = []
+            reused_positions = []
+            stored_rows = 0  # Rows answered from the state file
+            repeated_rows = 0  # Rows identical to an earlier new or changed row of this run
+            for position, fingerprint in enumerate(fingerprints):
+                if fingerprint in state['rows']:
+                    stored_rows += 1
+                elif fingerprint in rows:
+                    repeated_rows += 1
+                if fingerprint in rows:  # Identical rows share a fingerprint and are scanned once
+                    continue
+                if fingerprint in state['rows']:
+                    hits = state['rows'][fingerprint]
+                    rows[fingerprint] = [hit for hit in hits if term_key(hit[1]) in terms] if removed_terms else hits
+                    reused_positions.append(position)
+                else:
+                    rows[fingerprint] = []
+                    changed_positions.append(position)
+
+            scans = [(matcher, changed_positions)]
+            if added_terms and reused_positions:
+                added_matcher = (HeadingIndex if headings else LexiconMatcher)(
+                    [key[0] for key in added_terms], [key[1] for key in added_terms], normalizer=matcher.normalizer,
+                    sources=[key[2] for key in added_terms] if matcher.sourced else None)
+                scans.append((added_matcher, reused_positions))
+            for scan_matcher, positions in scans:
+                for row_position, col_position, entries in find_hits(scan_matcher, self.metadata_df.iloc[positions],
+                                                                     selected_columns, self.scan_stats,
+                                                                     self.profiler):
+                    row_hits = rows[fingerprints[positions[row_position]]]
+                    row_hits.extend((col_position, scan_matcher.entries[index]) for index in entries)
+
+            # Lay the hits out in the order a full scan reports them: by column, then lexicon order
+            entry_indices = {}
+            for index, entry in enumerate(matcher.entries):
+                entry_indices.setdefault(entry, []).append(index)
+            matches = []
+            identifiers = self.metadata_df[self.identifier_column].tolist()
+            for identifier, fingerprint in zip(identifiers, fingerprints):
+                for col_position, index in sorted((col_position, index) for col_position, entry in set(rows[fingerprint])
+                                                  for index in entry_indices[entry]):
+                    entry = matcher.entries[index]
+                    matches.append((identifier, entry[0], entry[1], selected_columns[col_position]) + entry[2:])
+
+        try:
+            write_state(state_file, {'settings': settings, 'terms': terms, 'rows': rows})
+        except OSError as e:
+            print(f"An error occurred while saving the incremental state: {e}")
+        print(f"Scanned {len(changed_positions)} new or changed rows; "
+              f"reused stored matches for {stored_rows} unchanged rows.")
+        if repeated_rows:
+            print(f"{repeated_rows} rows repeated an earlier new or changed row and shared its matches.")
+        if state['terms'] and (added_terms or removed_terms):
+            print(f"Lexicon changes: {len(added_terms)} terms added and scanned for, "
+                  f"{len(removed_terms)} terms removed.")
+        if self.profiler is not None:
+            self.profiler.count_matches(matches)
         return matches
 
+    def report_scan_stats(self):
+        """Print how many cell scans were saved by matching each distinct value only once."""
+        if self.scan_stats['cells']:
+            saved = self.scan_stats['cells'] - self.scan_stats['scans']
+            print(f"Scanned {self.scan_stats['scans']} distinct values for {self.scan_stats['cells']} "
+                  f"text cells ({saved} scans saved).")
+
+    def find_matches_parallel(self, matcher, selected_columns, workers):
+        """Find matches by sharding the metadata into row ranges matched in separate processes.
+
+        Shards are merged back in row order, so the result equals the single-process scan.
+
+        Parameters:
+        matcher (LexiconMatcher): Compiled lexicon to match against.
+        selected_columns (list of str): List of column names from metadata for matching.
+        workers (int): Number of worker processes.
+
+        Returns:
+        MatchTable: The matches.
+
+        """
+        # Only ship the columns the workers actually read
+        needed_columns = list(dict.fromkeys(selected_columns + [self.identifier_column]))
+        metadata_df = self.metadata_df[needed_columns]
+        # A few shards per worker keeps the pool busy when some row ranges are denser than others
+        shard_size = max(1, math.ceil(len(metadata_df) / (workers * 4)))
+        shards = [metadata_df.iloc[start:start + shard_size] for start in range(0, len(metadata_df), shard_size)]
+
+        rows, entry_ids, column_codes = [], [], []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matcher,)) as executor:
+            results = executor.map(_match_shard_arrays, shards, [selected_columns] * len(shards))
+            for start, (shard_rows, shard_entry_ids, shard_column_codes, shard_stats) in zip(
+                    range(0, len(metadata_df), shard_size), results):
+                rows.append(shard_rows + start)
+                entry_ids.append(shard_entry_ids)
+                column_codes.append(shard_column_codes)
+                self.scan_stats.update(shard_stats)
+        if not rows:
+            return MatchTable(matcher.entries, metadata_df[self.identifier_column], selected_columns)
+        return MatchTable(matcher.entries, metadata_df[self.identifier_column], selected_columns,
+                          np.concatenate(rows), np.concatenate(entry_ids), np.concatenate(column_codes))
+
+    def assess_files(self, file_paths, output_dir, jobs=1, headings=False, chunk_size=BATCH_CHUNK_SIZE,
+                     output_format='csv'):
+        """Match many metadata files against the lexicon, compiled once, writing one results file per input.
+
+        Each file is streamed `chunk_size` rows at a time, reading only the selected and
+        identifier columns. A file that cannot be read (for example because it lacks a selected
+        column) is reported and skipped.
+
+        Parameters:
+        file_paths (list of str): Metadata files.
+        output_dir (str): Directory for the results; created if needed. See `batch_output_files`.
+        jobs (int): Number of files matched at once, each in its own process.
+        headings (bool): Treat the selected columns as LCSH subject headings.
+        chunk_size (int): Number of metadata rows read at a time from each file.
+        output_format (str): Format of the results files: "csv", "csv.gz", "csv.zst", "parquet" or "arrow".
+
+        Returns:
+        int: Number of files that failed.
+
+        """
+        matcher = self.compile_matcher(self.categories, headings=headings)
+        output_columns = self.output_columns(headings)
+        os.makedirs(output_dir, exist_ok=True)
+        output_files = batch_output_files(file_paths, output_dir, output_format)
+        self.scan_stats = collections.Counter()
+        failures = 0
+
+        def report(file_path, output_file, result):
+            rows, matches, scan_stats = result
+            self.scan_stats.update(scan_stats)
+            print(f"{file_path}: {matches} matches in {rows} rows, saved to {output_file}")
+
+        with self.profile('match files'):
+            if jobs > 1:
+                with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(matcher,)) as executor:
+                    futures = [executor.submit(_assess_file, file_path, output_file, self.selected_columns,
+                                               self.identifier_column, output_columns, chunk_size)
+                               for file_path, output_file in zip(file_paths, output_files)]
+                    for file_path, output_file, future in zip(file_paths, output_files, futures):
+                        try:
+                            report(file_path, output_file, future.result())
+                        except Exception as e:
+                            failures += 1
+                            print(f"An error occurred while matching {file_path}: {e}")
+            else:
+                for file_path, output_file in zip(file_paths, output_files):
+                    try:
+                        report(file_path, output_file,
+                               assess_file(matcher, file_path, output_file, self.selected_columns,
+                                           self.identifier_column, output_columns, chunk_size))
+                    except Exception as e:
+                        failures += 1
+                        print(f"An error occurred while matching {file_path}: {e}")
+
+        print(f"Matched {len(file_paths) - failures} of {len(file_paths)} files.")
+        self.report_scan_stats()
+        return failures
+
+
+def load_lexicon_files(tool, specs):
+    """Load one lexicon, or several tagged by source, from command-line arguments.
+
+    Parameters:
+    tool (MaRMAT): The tool to load them into.
+    specs (list of str): Lexicon paths, each optionally prefixed with a source name ("LCSH=lexicon-LCSH.csv").
+        A single unnamed path is loaded on its own, without a "Lexicon" column; otherwise unnamed
+        lexicons are named after their file.
+
+    """
+    if len(specs) == 1 and '=' not in specs[0]:
+        tool.load_lexicon(specs[0])
+        return
+    lexicon_files = {}
+    for spec in specs:
+        source, _, file_path = spec.rpartition('=')
+        lexicon_files[source or os.path.splitext(os.path.basename(file_path))[0]] = file_path
+    tool.load_lexicons(lexicon_files)
+
+
+def run_batch(args, tool):
+    """Run the batch mode of the command line: every option comes from `args`, nothing is asked."""
+    file_paths = expand_metadata_paths(args.metadata)
+    if not file_paths:
+        print("No metadata files matched.")
+        return 1
+    if not args.columns or not args.identifier:
+        print("Batch mode needs --columns and --identifier.")
+        return 1
+    load_lexicon_files(tool, args.lexicon)
+    if tool.lexicon_df is None:
+        return 1
+    tool.select_columns([col.strip() for col in args.columns.split(",")])
+    tool.select_identifier_column(args.identifier)
+    if args.categories:
+        tool.select_categories([cat.strip() for cat in args.categories.split(",")])
+    else:
+        tool.select_categories(tool.lexicon_df['category'].dropna().unique().tolist())
+    if args.state_file:
+        print("--state-file is ignored in batch mode.")
+    failures = tool.assess_files(file_paths, args.output_dir, jobs=args.jobs, headings=args.headings,
+                                 chunk_size=args.chunk_size or BATCH_CHUNK_SIZE, output_format=args.output_format)
+    return 1 if failures else 0
+
+
 # Main program for command line interaction
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Marriott Reparative Metadata Assessment Tool (MaRMAT). Run without --lexicon to be asked "
+                    "for each setting; with --lexicon, every metadata file given is matched without prompts.")
+    parser.add_argument("metadata", nargs="*",
+                        help="Batch mode: metadata files (CSV, TSV, JSON Lines, Parquet or OAI-PMH XML, "
+                             "optionally .gz or .zst compressed), glob patterns (quote them) or directories.")
+    parser.add_argument("--lexicon", action="append", default=None,
+                        help="Batch mode: the lexicon CSV file, compiled once for all metadata files. Repeat it, "
+                             "optionally as NAME=PATH, to match several lexicons in one pass; the results then "
+                             "gain a Lexicon column.")
+    parser.add_argument("--columns", default=None,
+                        help="Batch mode: comma-separated metadata columns to match.")
+    parser.add_argument("--identifier", default=None,
+                        help="Batch mode: the identifier column.")
+    parser.add_argument("--categories", default=None,
+                        help="Batch mode: comma-separated lexicon categories (default: all).")
+    parser.add_argument("--output-dir", default=".",
+                        help="Batch mode: directory for the results, one NAME-matches.csv per input (default: .).")
+    parser.add_argument("--output-format", default="csv", choices=["csv", "csv.gz", "csv.zst", "parquet", "arrow"],
+                        help="Batch mode: format of the results files (default: csv). Parquet and Arrow need pyarrow, "
+                             "csv.zst needs zstandard.")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Batch mode: number of files to match at once, each in its own process (default: 1).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes to use for matching (default: 1).")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Stream the metadata this many rows at a time, writing results as they are found.")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Directory in which to cache compiled lexicons between runs.")
+    parser.add_argument("--cache-max-mb", type=int, default=256,
+                        help="Size the lexicon cache is trimmed back to, in megabytes (default: 256).")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="Empty the lexicon cache before running.")
+    parser.add_argument("--headings", action="store_true",
+                        help="Match the selected columns as LCSH subject headings (exact and broad matches).")
+    parser.add_argument("--fold-diacritics", action="store_true",
+                        help="Ignore accents when matching, so that e.g. \"Metis\" also matches \"Métis\".")
+    parser.add_argument("--state-file", default=None,
+                        help="Remember each row's matches in this file and, on later runs, rescan only new or changed rows.")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Save the results without printing them first.")
+    parser.add_argument("--profile", metavar="REPORT", default=None,
+                        help="Record time and memory per phase, column and term, and write a report to this file.")
+    args = parser.parse_args()
+
+    matcher_cache = None
+    if args.cache_dir:
+        matcher_cache = MatcherCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+        if args.clear_cache:
+            print(f"Removed {matcher_cache.invalidate()} cached lexicons.")
+
+    profiler = Profiler() if args.profile else None
+    if args.lexicon:
+        tool = MaRMAT(matcher_cache=matcher_cache, profiler=profiler)
+        tool.fold_diacritics = args.fold_diacritics
+        status = run_batch(args, tool)
+        if profiler is not None:
+            profiler.write_report(args.profile)
+            print(f"Profile saved to {args.profile}")
+        sys.exit(status)
+
     print("1. Initialize the tool:")
-    tool = MaRMAT()
+    tool = MaRMAT(matcher_cache=matcher_cache, profiler=profiler)
+    tool.fold_diacritics = args.fold_diacritics
 
     print("\n2. Load lexicon and metadata files:")
-    lexicon_path = input("Enter the path to the lexicon CSV file: ")
-    tool.load_lexicon(lexicon_path)
+    lexicon_paths = input("Enter the path to the lexicon CSV file (or several, separated by semicolons): ")
+    load_lexicon_files(tool, [path.strip() for path in lexicon_paths.split(";") if path.strip()])
     
     metadata_path = input("Enter the path to the metadata CSV file: ")
-    tool.load_metadata(metadata_path)
+    tool.load_metadata(metadata_path, chunk_size=args.chunk_size, deferred=True)
 
     print("\n3. Select columns for matching:")
     columns = input("Enter the column names for matching, separated by commas: ").split(",")
@@ -134,5 +2458,10 @@ if __name__ == "__main__":
     tool.select_categories([cat.strip() for cat in categories])  # Strip whitespace
 
     print("\n6. Perform matching and view results:")
-    output_file = input("Enter the path to save the output CSV file: ")
-    tool.perform_matching(output_file)
+    output_file = input("Enter the path to save the output file (.csv, .csv.gz, .csv.zst, .parquet or .arrow): ")
+    tool.perform_matching(output_file, workers=args.workers, headings=args.headings, state_file=args.state_file,
+                          show=not args.quiet)
+
+    if profiler is not None:
+        profiler.write_report(args.profile)
+        print(f"Profile saved to {args.profile}")
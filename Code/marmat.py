@@ -0,0 +1,19 @@
+"""Importable name for the MaRMAT matching engine.
+
+The engine lives in MarMAT-CommandLine-2.6.py, whose file name is not a valid module name. With
+this folder on `sys.path`, `import marmat` loads it under the name "marmat". Worker processes
+started with the "spawn" method (the default on Windows and macOS) import it the same way, so
+process-pool matching also works when the engine is used from another script.
+"""
+
+import importlib.util
+import os
+import sys
+
+MARMAT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "MarMAT-CommandLine-2.6.py")
+
+# Replace this stub with the engine itself, so pickled engine objects refer to "marmat"
+_spec = importlib.util.spec_from_file_location(__name__, MARMAT_PATH)
+_engine = importlib.util.module_from_spec(_spec)
+sys.modules[__name__] = _engine
+_spec.loader.exec_module(_engine)
@@ -10,6 +10,69 @@ import re
 nltk.download('punkt')
 nltk.download('stopwords')
 
+def iter_xml_records(xml_file):
+    """
+    Streams the records of an OAI-PMH XML file, yielding the fields needed for the audit one record at a time.
+
+    Parameters:
+    - xml_file (str): File path of the XML input file.
+
+    Returns:
+    - generator: Tuples of (identifier, title, subject, identifier_url) for each record.
+
+    Note:
+    - The file is read incrementally and each record is discarded once its fields have been read, so large harvests do not have to fit in memory.
+    - As before, the first dc:identifier, dc:title and dc:subject of each record are used.
+    """
+
+    record_tag = '{http://www.openarchives.org/OAI/2.0/}record'
+    field_tags = {
+        '{http://purl.org/dc/elements/1.1/}identifier': 'identifier',
+        '{http://purl.org/dc/elements/1.1/}title': 'title',
+        '{http://purl.org/dc/elements/1.1/}subject': 'subject'
+    }
+
+    open_elements = []
+    fields = {}
+    for event, element in ET.iterparse(xml_file, events=('start', 'end')):
+        if event == 'start':
+            open_elements.append(element)
+            continue
+        open_elements.pop()
+        if element.tag in field_tags:
+            # Keep the first occurrence of each field, like record.find()
+            fields.setdefault(field_tags[element.tag], element.text)
+        elif element.tag == record_tag:
+            identifier = fields.get('identifier') or ""
+            yield identifier, fields.get('title') or "", fields.get('subject') or "", identifier
+            fields = {}
+            # Remove the finished record from its parent so memory stays flat
+            if open_elements:
+                open_elements[-1].remove(element)
+
+def iter_token_rows(xml_file):
+    """
+    Streams the token rows of an OAI-PMH XML file: one row per title or subject token, with the other columns filled down.
+
+    Parameters:
+    - xml_file (str): File path of the XML input file.
+
+    Returns:
+    - generator: Rows of [Identifier, Title, Subject, IdentifierURL, Token].
+    """
+
+    # Load stopwords and punctuation
+    stop_words = set(stopwords.words('english'))
+    punctuation = set(string.punctuation)
+
+    for identifier, title, subject, identifier_url in iter_xml_records(xml_file):
+        # Tokenize and preprocess title and subject
+        title_tokens = [word for word in word_tokenize(title.lower()) if word not in stop_words and word not in punctuation and not word.isdigit() and word != '--'] if title else []
+        subject_tokens = [word for word in word_tokenize(subject.lower()) if word not in stop_words and word not in punctuation and not word.isdigit() and word != '--'] if subject else []
+
+        for token in title_tokens + subject_tokens:
+            yield [identifier, title, subject, identifier_url, token]
+
 def parse_xml_to_csv(xml_file, csv_file):
     """
     Parses an XML file containing specific metadata and writes the extracted data into a CSV file.
@@ -21,48 +84,18 @@ def parse_xml_to_csv(xml_file, csv_file):
     Note:
     - Make sure the XML file follows a specific structure with predefined namespaces.
     - Ensure that the CSV file path points to a writable location.
+    - Records are streamed from the XML file, so rows are written as each record is read.
     """
 
-    # Define namespaces
-    namespaces = {
-        'oai': 'http://www.openarchives.org/OAI/2.0/',
-        'qdc': 'http://worldcat.org/xmlschemas/qdc-1.0/',
-        'dcterms': 'http://purl.org/dc/terms/',
-        'dc': 'http://purl.org/dc/elements/1.1/'
-    }
-    
-    # Load stopwords and punctuation
-    stop_words = set(stopwords.words('english'))
-    punctuation = set(string.punctuation)
-    
-    # Parse XML
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-    
     # Open CSV file for writing
     with open(csv_file, 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
-        
+
         # Write headers
         writer.writerow(['Identifier', 'Title', 'Subject', 'IdentifierURL', 'Token'])
-        
-        # Extract data from XML and write to CSV
-        for record in root.findall('.//oai:record', namespaces):
-            identifier = record.find('./oai:metadata/qdc:qualifieddc/dc:identifier', namespaces).text if record.find('./oai:metadata/qdc:qualifieddc/dc:identifier', namespaces) is not None else ""
-            title = record.find('./oai:metadata/qdc:qualifieddc/dc:title', namespaces).text if record.find('./oai:metadata/qdc:qualifieddc/dc:title', namespaces) is not None else ""
-            subject = record.find('./oai:metadata/qdc:qualifieddc/dc:subject', namespaces).text if record.find('./oai:metadata/qdc:qualifieddc/dc:subject', namespaces) is not None else ""
-            identifier_url = record.find('./oai:metadata/qdc:qualifieddc/dc:identifier', namespaces).text if record.find('./oai:metadata/qdc:qualifieddc/dc:identifier', namespaces) is not None else ""
-            
-            # Tokenize and preprocess title and subject
-            title_tokens = [word for word in word_tokenize(title.lower()) if word not in stop_words and word not in punctuation and not word.isdigit() and word != '--'] if title else []
-            subject_tokens = [word for word in word_tokenize(subject.lower()) if word not in stop_words and word not in punctuation and not word.isdigit() and word != '--'] if subject else []
-            
-            # Write each token as a separate row with other columns filled down
-            for token in title_tokens:
-                writer.writerow([identifier, title, subject, identifier_url, token])
-                
-            for token in subject_tokens:
-                writer.writerow([identifier, title, subject, identifier_url, token])
+
+        # Write each token as a separate row with other columns filled down
+        writer.writerows(iter_token_rows(xml_file))
 
 # Define file paths
 xml_file_path = "PATH_TO_XML_FILE"  # Insert path to your XML file
@@ -117,6 +150,38 @@ def load_lexicon_from_csv(file_path):
     
     return lexicon
 
+def index_lexicon(lexicon):
+    """
+    Inverts a lexicon dictionary so that each term maps to the categories it belongs to.
+
+    Parameters:
+    - lexicon (dict): Dictionary containing lexicon categories as keys and lists of terms as values.
+
+    Returns:
+    - categories_by_term (dict): Dictionary containing terms as keys and lists of categories as values, in lexicon order.
+    """
+
+    categories_by_term = {}
+    for category, terms in lexicon.items():
+        for term in dict.fromkeys(terms):
+            categories_by_term.setdefault(term, []).append(category)
+    return categories_by_term
+
+def write_matching_rows(categories_by_term, rows, writer):
+    """
+    Writes the rows whose token is a lexicon term, with the matching lexicon categories appended.
+
+    Parameters:
+    - categories_by_term (dict): Dictionary containing terms as keys and lists of categories as values.
+    - rows (iterable): Rows whose 5th column is the token.
+    - writer (csv.writer): Writer for the output CSV file.
+    """
+
+    for row in rows:
+        matching_categories = categories_by_term.get(row[4])  # Assuming token is in the 5th column
+        if matching_categories:
+            writer.writerow(row + [', '.join(matching_categories)])
+
 def search_and_append_lexicon_category(lexicon, input_csv_file, output_csv_file):
     """
     Searches for lexicon term matches in an input CSV file, appends lexicon categories to each row, and writes the modified data into an output CSV file.
@@ -129,42 +194,45 @@ def search_and_append_lexicon_category(lexicon, input_csv_file, output_csv_file)
     Note:
     - The input CSV file should contain a 'Token' column where lexicon term matches will be searched.
     - The output CSV file will have an additional column 'LexiconCategory' appended to each row, indicating the matched lexicon categories.
+    - Only rows with a LexiconCategory are written.
     """
 
     # Load lexicon
-    lexicon = load_lexicon_from_csv(lexicon)
+    categories_by_term = index_lexicon(load_lexicon_from_csv(lexicon))
 
     # Open input CSV file for reading and output CSV file for writing
     with open(input_csv_file, 'r', newline='', encoding='utf-8') as input_csv, \
          open(output_csv_file, 'w', newline='', encoding='utf-8') as output_csv:
-        
+
         reader = csv.reader(input_csv)
         writer = csv.writer(output_csv)
-        
+
         # Write headers to the output CSV file
         headers = next(reader)
         headers.append('LexiconCategory')
         writer.writerow(headers)
-        
-        # Iterate over rows in the input CSV file
-        for row in reader:
-            token = row[4]  # Assuming token is in the 5th column
-            # Search for matches between token and terms in the lexicon
-            matching_categories = [category for category, terms in lexicon.items() if token in terms]
-            # Append lexicon category to the row
-            row.append(', '.join(matching_categories))
-            # Write the modified row to the output CSV file
-            writer.writerow(row)
-
-    # Open the output CSV file again to remove rows without a LexiconCategory
-    with open(output_csv_file, 'r', newline='', encoding='utf-8') as output_csv:
-        reader = csv.reader(output_csv)
-        # Filter rows based on presence of LexiconCategory
-        rows_to_keep = [row for row in reader if row[-1] != '']  # Assuming LexiconCategory is the last column
-        # Write filtered rows back to the output CSV file
-        with open(output_csv_file, 'w', newline='', encoding='utf-8') as updated_output_csv:
-            writer = csv.writer(updated_output_csv)
-            writer.writerows(rows_to_keep)
+
+        write_matching_rows(categories_by_term, reader, writer)
+
+def audit_xml(xml_file, lexicon, output_csv_file):
+    """
+    Searches an XML file for lexicon term matches directly, without writing the intermediate token CSV.
+
+    Parameters:
+    - xml_file (str): File path of the XML input file.
+    - lexicon (str): File path of the lexicon CSV file.
+    - output_csv_file (str): File path of the output CSV file.
+
+    Note:
+    - The output is the same as running parse_xml_to_csv and then search_and_append_lexicon_category, but records are tokenized and matched as they are read and only matching rows are ever written.
+    """
+
+    categories_by_term = index_lexicon(load_lexicon_from_csv(lexicon))
+
+    with open(output_csv_file, 'w', newline='', encoding='utf-8') as output_csv:
+        writer = csv.writer(output_csv)
+        writer.writerow(['Identifier', 'Title', 'Subject', 'IdentifierURL', 'Token', 'LexiconCategory'])
+        write_matching_rows(categories_by_term, iter_token_rows(xml_file), writer)
 
 # File paths
 lexicon_file_path = "PATH_TO_LEXICON_CSV_FILE"  # Insert path to your lexicon CSV file